@@ -0,0 +1,96 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements adaptive metrics collection interval based on
+contention detection state and agent CPU overhead
+"""
+
+from __future__ import division
+
+import os
+import time
+
+
+class AgentOverhead(object):
+    """ This class measures CPU usage of agent process between two calls """
+
+    def __init__(self):
+        self._cpu = self._cpu_time()
+        self._wall = time.time()
+
+    @staticmethod
+    def _cpu_time():
+        times = os.times()
+        return times[0] + times[1]
+
+    def sample(self):
+        """ return agent CPU usage percentage of one logical processor """
+        cpu = self._cpu_time()
+        wall = time.time()
+        usage = 0.0
+        if wall > self._wall:
+            usage = (cpu - self._cpu) / (wall - self._wall) * 100
+        self._cpu = cpu
+        self._wall = wall
+        return usage
+
+
+class AdaptiveInterval(object):
+    """
+    This class decides metrics collection interval of next cycle. Interval
+    drops to minimal when contention is detected or CPI of any LC container
+    reaches CPI_RATIO of its threshold, doubles after stable cycles, and
+    doubles whenever agent overhead exceeds budget
+    """
+    CPI_RATIO = 0.9
+
+    def __init__(self, interval, min_interval, max_interval, cpu_budget,
+                 stable_cycles=3):
+        """
+        interval - initial interval in seconds
+        min_interval - minimal interval in seconds
+        max_interval - maximal interval in seconds
+        cpu_budget - agent CPU usage budget in percentage of one processor
+        stable_cycles - stable cycles before interval is lengthened
+        """
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cpu_budget = cpu_budget
+        self.stable_cycles = stable_cycles
+        self.stable = 0
+        self.overhead = AgentOverhead()
+
+    def update(self, pressure):
+        """
+        Update interval with state of finished cycle, return new interval
+            pressure - contention is detected or close in finished cycle
+        """
+        usage = self.overhead.sample()
+        if usage > self.cpu_budget:
+            self.stable = 0
+            self.interval = min(self.interval * 2, self.max_interval)
+        elif pressure:
+            self.stable = 0
+            self.interval = self.min_interval
+        else:
+            self.stable += 1
+            if self.stable >= self.stable_cycles:
+                self.stable = 0
+                self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
@@ -21,10 +21,9 @@ from __future__ import print_function
 from __future__ import division
 
 import argparse
-import pandas as pd
-from container import Container, Contention
-from eris import remove_finished_containers, detect_contender
-from analyze.analyzer import Analyzer, ThreshType
+from recorder import read_records
+from replay import Replay, slice_records
+from analyze.analyzer import Analyzer
 
 
 def process_offline_data(args, analyzer):
@@ -32,37 +31,11 @@ def process_offline_data(args, analyzer):
     General procedure of offline analysis
         args - arguments from command line input
     """
-    metric_cons = dict()
-
-    mdf = pd.read_csv(args.metric_file)
+    mdf = slice_records(read_records(args.metric_file), args.start, args.end)
     key = 'cid' if args.key_cid else 'name'
-    times = mdf['time'].unique()
-    for time in times:
-        pdata = mdf[mdf['time'] == time]
-        cids = pdata[key].unique()
-        remove_finished_containers(cids, metric_cons)
-        for cid in cids:
-            jdata = pdata[pdata[key] == cid]
-            thresh = analyzer.get_thresh(cid, ThreshType.METRICS)
-            tdp_thresh = analyzer.get_thresh(cid, ThreshType.TDP)
-            if cid in metric_cons:
-                con = metric_cons[cid]
-            else:
-                con = Container('cgroupfs', '', cid, [], args.verbose, thresh,
-                                tdp_thresh)
-                metric_cons[cid] = con
-            for row_tuple in jdata.iterrows():
-                con.update_metrics(row_tuple)
-
-        for cid in cids:
-            con = metric_cons[cid]
-            contend_res = con.contention_detect()
-            tdp_contend = con.tdp_contention_detect()
-            if tdp_contend:
-                contend_res.append(tdp_contend)
-            for contend in contend_res:
-                if contend != Contention.UNKN:
-                    detect_contender(metric_cons, contend, con)
+    replay = Replay(mdf, key, analyzer, args.history_depth, args.suspects,
+                    args.verbose)
+    replay.run(args.jobs)
 
 
 def process(args):
@@ -76,7 +49,8 @@ def process(args):
     else:
         strict = True if args.fense_type == 'gmm-strict' else False
         use_origin = True if args.fense_method == 'gmm-origin' else False
-        analyzer.build_model(args.util_file, args.metric_file,
+        analyzer.build_model(read_records(args.util_file),
+                             read_records(args.metric_file),
                              args.thresh, strict, use_origin, args.verbose)
 
 
@@ -102,15 +76,29 @@ def main():
                         detection', choices=['gmm-strict', 'gmm-normal'],
                         default='gmm-strict')
     parser.add_argument('-m', '--metric-file', help='metrics file collected\
-                        from eris agent', type=argparse.FileType('rt'),
+                        from eris agent, in csv or binary format',
                         default=Analyzer.METRIC_FILE)
     parser.add_argument('-u', '--util-file', help='Utilization file collected\
-                        from eris agent', type=argparse.FileType('rt'),
+                        from eris agent, in csv or binary format',
                         default=Analyzer.UTIL_FILE)
     parser.add_argument('-o', '--offline', help='do offline analysis based on\
                         given metrics file', action='store_true')
     parser.add_argument('-i', '--key-cid', help='use container id in workload\
                         configuration file as key id', action='store_true')
+    parser.add_argument('--suspects', help='maximal number of suspects\
+                        reported for one resource contention', type=int,
+                        default=3)
+    parser.add_argument('--history-depth', help='number of previous metrics\
+                        cycles compared with current one in contender\
+                        detection', type=int, default=5)
+    parser.add_argument('--start', help='replay metrics recorded at or after\
+                        given time in offline analysis, e.g. "2018-07-01\
+                        10:00:00"')
+    parser.add_argument('--end', help='replay metrics recorded at or before\
+                        given time in offline analysis')
+    parser.add_argument('-j', '--jobs', help='number of processes replaying\
+                        containers in parallel in offline analysis', type=int,
+                        default=1)
 
     args = parser.parse_args()
     if args.verbose:
@@ -118,5 +106,6 @@ def main():
 
     process(args)
 
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,99 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements write coalescing of cgroup control files """
+
+from __future__ import print_function
+
+from collections import OrderedDict
+
+
+def write_file(path, value):
+    """
+    Write value into cgroup control file
+        path - control file path
+        value - value string
+    """
+    with open(path, 'w') as ctrlf:
+        ctrlf.write(value)
+
+
+def read_file(path):
+    """
+    Read first line of cgroup control file
+        path - control file path
+    """
+    with open(path) as ctrlf:
+        return ctrlf.readline()
+
+
+class CgroupWriter(object):
+    """
+    This class stages writes of cgroup control files and flushes them in one
+    batch. Last written value of every file is cached, writes of unchanged
+    values are skipped, and only the last value staged for one file in a
+    batch is written
+    """
+
+    def __init__(self, sink=write_file):
+        """
+        sink - callable writes value string into control file path
+        """
+        self.sink = sink
+        self._written = {}
+        self._pending = OrderedDict()
+
+    def write(self, path, value, desc=''):
+        """
+        Stage write of control file, return True if the value is changed
+            path - control file path
+            value - value to write
+            desc - description of the write in flush result
+        """
+        if self._written.get(path) == value:
+            self._pending.pop(path, None)
+            return False
+        self._pending[path] = (value, desc)
+        return True
+
+    def flush(self):
+        """
+        Write all staged values, return descriptions of successful writes.
+        Cached value of a failed write is dropped so it is retried next time
+        """
+        done = []
+        pending = self._pending
+        self._pending = OrderedDict()
+        for path, (value, desc) in pending.items():
+            try:
+                self.sink(path, str(value))
+            except (IOError, OSError) as err:
+                self._written.pop(path, None)
+                print('error in write ' + path + ': ' + str(err))
+                continue
+            self._written[path] = value
+            done.append(desc)
+        return done
+
+    def forget(self, prefix):
+        """
+        Drop cached and staged values of control files under prefix
+            prefix - cgroup directory path
+        """
+        for cache in (self._written, self._pending):
+            for path in [path for path in cache if path.startswith(prefix)]:
+                del cache[path]
@@ -23,13 +23,29 @@ from __future__ import print_function
 from __future__ import division
 
 import time
-import multiprocessing
 
-from collections import deque
-from itertools import islice
 from enum import Enum
 from os.path import join as path_join
 from analyze.analyzer import Metric
+from history import MetricHistory
+from pidtracker import PidTracker
+
+
+def parse_cpu_list(text):
+    """
+    Return sorted logical processor ids of cpu list
+        text - cpu list in cpuset format, e.g. 0-3,8
+    """
+    cpus = set()
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
 
 
 class Contention(Enum):
@@ -46,6 +62,10 @@ class Container(object):
     This class is the abstraction of one task, container metrics and
     contention detection method are encapsulated in this module
     """
+    HISTORY_COLUMNS = [Metric.INST, Metric.CYC, Metric.CPI, Metric.L3MPKI,
+                       Metric.L3MISS, Metric.NF, Metric.UTIL, Metric.L3OCC,
+                       Metric.MBL, Metric.MBR, Metric.L2STALL,
+                       Metric.MEMSTALL, Metric.L2SPKI, Metric.MSPKI]
 
     def __init__(
             self, cgroup_driver, cid, name, pids, verbose,
@@ -56,24 +76,40 @@ class Container(object):
         self.cpu_usage = 0
         self.system_usage = 0
         self.utils = 0
+        self.metric_cpu_usage = 0
+        self.metric_system_usage = 0
+        self.metric_utils = 0
         self.timestamp = 0.0
         self.thresh = thresh
         self.tdp_thresh = tdp_thresh
         self.verbose = verbose
         self.metrics = dict()
+        self.coverage = 0.0
+        self.event_sample = None
         self.history_depth = history_depth + 1
-        self.metrics_history = deque([], self.history_depth)
+        self.metrics_history = MetricHistory(Container.HISTORY_COLUMNS,
+                                             self.history_depth)
         self.cpusets = []
+        self.socket = None
         if cgroup_driver == 'systemd':
             self.con_path = 'docker-' + cid + '.scope'
             self.parent_path = 'system.slice/'
         else:
             self.con_path = cid
             self.parent_path = 'docker/'
+        self.pid_tracker = PidTracker(path_join(
+            '/sys/fs/cgroup/cpu', self.parent_path, self.con_path, 'tasks'))
+        self.cpuset_path = path_join('/sys/fs/cgroup/cpuset',
+                                     self.parent_path, self.con_path,
+                                     'cpuset.cpus')
 
     def __str__(self):
+        return ','.join(str(col) for col in self.get_record()) + '\n'
+
+    def get_record(self):
+        """ return metrics of container as one row of metric record """
         metrics = self.metrics
-        cols = [
+        return [
             metrics['time'],
             self.cid,
             self.name,
@@ -83,7 +119,7 @@ class Container(object):
             metrics[Metric.L3MPKI],
             metrics[Metric.L3MISS],
             metrics[Metric.NF],
-            self.utils,
+            metrics[Metric.UTIL],
             metrics[Metric.L3OCC],
             metrics[Metric.MBL],
             metrics[Metric.MBR],
@@ -92,7 +128,6 @@ class Container(object):
             metrics[Metric.L2SPKI],
             metrics[Metric.MSPKI],
         ]
-        return ','.join(str(col) for col in cols) + '\n'
 
     def update_metrics(self, row_tuple):
         key_mappings = [('time', str), (Metric.INST, int), (Metric.CYC, int),
@@ -104,20 +139,11 @@ class Container(object):
                         (Metric.MSPKI, float)]
         for key, converter in key_mappings:
             self.metrics[key] = converter(row_tuple[1][key])
-        self.utils = float(row_tuple[1][Metric.UTIL])
+        self.metrics[Metric.UTIL] = float(row_tuple[1][Metric.UTIL])
         self.update_metrics_history()
 
     def get_history_delta_by_type(self, column_name):
-        length = len(self.metrics_history)
-        if length == 0:
-            return 0
-        if length == 1:
-            return self.metrics_history[0][column_name]
-        data_sum = sum(m[column_name] for m in
-                       list(islice(self.metrics_history, length - 1)))
-        data_avg = float(data_sum) / (length - 1)
-        data_delta = self.metrics_history[-1][column_name] - data_avg
-        return data_delta
+        return self.metrics_history.delta(column_name)
 
     def get_llcoccupany_delta(self):
         return self.get_history_delta_by_type(Metric.L3OCC)
@@ -131,80 +157,76 @@ class Container(object):
 
         return mbl + mbr
 
-    def get_full_metrics(self, timestamp, interval):
-        """ retrieve container platform metrics """
-        self.update_cpu_usage()
-        metrics = self.metrics
-        if self.metrics:
-            metrics['time'] = timestamp
-            if metrics[Metric.INST] == 0:
-                metrics[Metric.CPI] = 0
-                metrics[Metric.L3MPKI] = 0
-                metrics[Metric.L2SPKI] = 0
-                metrics[Metric.MSPKI] = 0
-            else:
-                metrics[Metric.CPI] = metrics[Metric.CYC] /\
-                    metrics[Metric.INST]
-                metrics[Metric.L3MPKI] = metrics[Metric.L3MISS] * 1000 /\
-                    metrics[Metric.INST]
-                metrics[Metric.L2SPKI] = metrics[Metric.L2STALL] * 1000 /\
-                    metrics[Metric.INST]
-                metrics[Metric.MSPKI] = metrics[Metric.MEMSTALL] * 1000 /\
-                    metrics[Metric.INST]
-            if self.utils == 0:
-                metrics[Metric.NF] = 0
-            else:
-                metrics[Metric.NF] = int(metrics[Metric.CYC] / interval /
-                                         10000 / self.utils)
-        return metrics
-
-    def update_pids(self, pids):
+    def update_pids(self):
         """
-        update process ids of one Container
-            pids - pid list of Container
+        update thread ids of one Container from its cgroup, return tuple of
+        added and removed thread ids since previous update
         """
-        self.pids = pids
-    
-    def update_cpu_usage(self):
-        """ calculate cpu usage of container """
-        try:
-            total_usage = 0
-            system_usage = 0
-            cpu_util = 0.0
-            cur = time.time() * 1e9
-
-            with open("/proc/stat") as f:
-                stats = [int(e) for e in f.readline().split()[1:]]
-                system_usage = sum(stats) * 1e9 / 100
-
-            cgroup_stat = path_join('/sys/fs/cgroup/cpu', self.parent_path,
-                                  self.con_path, 'cpuacct.usage')
-            
-            with open(cgroup_stat, 'r') as fi:
-                total_usage = int(fi.read().strip())
-
-            cpu_delta = total_usage - self.cpu_usage
-            system_delta = system_usage - self.system_usage
-            cpu_no = multiprocessing.cpu_count()
-
-            if cpu_delta > 0 and system_delta > 0:
-                cpu_util = (float(cpu_delta) / system_delta) * cpu_no * 100
-            
-            self.timestamp = cur 
-            self.utils = cpu_util
-            self.cpu_usage = total_usage
-            self.system_usage = system_usage
-        except (ValueError, IOError):
-            pass
+        added, removed = self.pid_tracker.update()
+        if added or removed:
+            self.pids = self.pid_tracker.pids
+        return added, removed
+
+    def update_cpusets(self):
+        """
+        update logical processors the container may run on from its cpuset
+        cgroup, return True if they are changed
+        """
+        with open(self.cpuset_path) as cpusf:
+            cpusets = parse_cpu_list(cpusf.readline())
+        if cpusets == self.cpusets:
+            return False
+        self.cpusets = cpusets
+        return True
+
+    @staticmethod
+    def _calc_cpu_util(cpu_delta, system_delta, cpu_no):
+        cpu_util = 0.0
+        if cpu_delta > 0 and system_delta > 0:
+            cpu_util = (float(cpu_delta) / system_delta) * cpu_no * 100
+        return cpu_util
+
+    def update_cpu_usage(self, sample):
+        """
+        calculate cpu usage of container since last utilization cycle
+            sample - CpuUsage snapshot taken in current cycle
+        """
+        total_usage = sample.usages.get(self.cid)
+        if total_usage is None:
+            return
+
+        self.timestamp = time.time() * 1e9
+        self.utils = self._calc_cpu_util(
+            total_usage - self.cpu_usage,
+            sample.system_usage - self.system_usage, sample.cpu_no)
+        self.cpu_usage = total_usage
+        self.system_usage = sample.system_usage
+
+    def update_metric_cpu_usage(self, sample):
+        """
+        calculate cpu usage of container since last metrics cycle
+            sample - CpuUsage snapshot taken in current cycle
+        """
+        total_usage = sample.usages.get(self.cid)
+        if total_usage is None:
+            return
+
+        self.metric_utils = self._calc_cpu_util(
+            total_usage - self.metric_cpu_usage,
+            sample.system_usage - self.metric_system_usage, sample.cpu_no)
+        self.metric_cpu_usage = total_usage
+        self.metric_system_usage = sample.system_usage
 
     def update_metrics_history(self):
         '''
         add metric data to metrics history
         metrics history only contains the most recent metrics data, defined by
-        self.historyDepth if histroy metrics data length exceeds the
-        self.historyDepth, the oldest data will be erased
+        self.history_depth if histroy metrics data length exceeds the
+        self.history_depth, the oldest data will be erased
         '''
-        self.metrics_history.append(self.metrics.copy())
+        metrics = self.metrics
+        self.metrics_history.append(
+            [metrics[col] for col in Container.HISTORY_COLUMNS])
 
     def __detect_in_bin(self, thresh):
         metrics = self.metrics
@@ -246,31 +268,53 @@ class Container(object):
         if not self.tdp_thresh:
             return None
 
+        utils = self.metrics[Metric.UTIL]
         if self.verbose:
-            print(self.utils, self.metrics[Metric.NF], self.tdp_thresh['util'],
+            print(utils, self.metrics[Metric.NF], self.tdp_thresh['util'],
                   self.tdp_thresh['bar'])
 
-        if self.utils >= self.tdp_thresh['util'] and\
+        if utils >= self.tdp_thresh['util'] and\
            self.metrics[Metric.NF] < self.tdp_thresh['bar']:
             print('TDP Contention Alert!')
             return Contention.TDP
 
         return None
 
-    def contention_detect(self):
-        """ detect resouce contention after find proper utilization bin """
-        if not self.thresh:
-            return []
-
+    def __find_bin(self):
+        """ return threshold of utilization bin, None if not in any bin """
+        utils = self.metrics[Metric.UTIL]
         for i in range(0, len(self.thresh)):
             thresh = self.thresh[i]
-            if self.utils < thresh['util_start']:
+            if utils < thresh['util_start']:
                 if i == 0:
-                    return []
+                    return None
 
-                return self.__detect_in_bin(self.thresh[i - 1])
+                return self.thresh[i - 1]
 
-            if self.utils >= thresh['util_start']:
-                if self.utils < thresh['util_end'] or\
+            if utils >= thresh['util_start']:
+                if utils < thresh['util_end'] or\
                    i == len(self.thresh) - 1:
-                    return self.__detect_in_bin(thresh)
+                    return thresh
+        return None
+
+    def contention_detect(self):
+        """ detect resouce contention after find proper utilization bin """
+        if not self.thresh:
+            return []
+
+        thresh = self.__find_bin()
+        if thresh is None:
+            return []
+        return self.__detect_in_bin(thresh)
+
+    def cpi_ratio(self):
+        """
+        return ratio of CPI to CPI threshold of utilization bin, 0 if there
+        is no threshold
+        """
+        if not self.thresh:
+            return 0
+        thresh = self.__find_bin()
+        if thresh is None or not thresh['cpi']:
+            return 0
+        return self.metrics[Metric.CPI] / thresh['cpi']
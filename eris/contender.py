@@ -0,0 +1,90 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements contender ranking of one metrics cycle """
+
+import numpy as np
+
+from container import Contention
+
+
+class ContenderIndex(object):
+    """
+    This class keeps resource usage of all containers in one metrics cycle.
+    Usage of every container is given or computed once when the index is
+    built, and containers are ranked per contention type on first query
+    """
+
+    def __init__(self, cids, names, usages):
+        """
+        cids - container ids
+        names - container names in order of cids
+        usages - map from contention type to usage array in order of cids
+        """
+        self.cids = list(cids)
+        self.names = list(names)
+        self.usages = usages
+        self._ranks = {}
+
+    @classmethod
+    def from_containers(cls, cons):
+        """
+        Build index from usage of containers
+            cons - all containers, map from container id to Container
+        """
+        containers = list(cons.values())
+        return cls([con.cid for con in containers],
+                   [con.name for con in containers], {
+                       Contention.LLC: np.array(
+                           [con.get_llcoccupany_delta() for con in containers],
+                           dtype=float),
+                       Contention.MEM_BW: np.array(
+                           [con.get_latest_mbt() for con in containers],
+                           dtype=float),
+                       Contention.TDP: np.array(
+                           [con.get_freq_delta() for con in containers],
+                           dtype=float),
+                   })
+
+    def _rank(self, contention_type):
+        """ return positions of containers with positive usage, descending """
+        rank = self._ranks.get(contention_type)
+        if rank is None:
+            usage = self.usages[contention_type]
+            rank = np.argsort(-usage, kind='stable')
+            rank = rank[:np.count_nonzero(usage > 0)].tolist()
+            self._ranks[contention_type] = rank
+        return rank
+
+    def top(self, contention_type, exclude_cid, k=1):
+        """
+        Return up to k suspects of contention type ranked by resource usage,
+        each suspect is a tuple of container name and usage
+            contention_type - contention type
+            exclude_cid - id of contended container which is not a suspect
+            k - maximal number of suspects
+        """
+        if contention_type not in self.usages:
+            return []
+        usage = self.usages[contention_type]
+        suspects = []
+        for pos in self._rank(contention_type):
+            if len(suspects) == k:
+                break
+            if self.cids[pos] != exclude_cid:
+                suspects.append((self.names[pos], usage[pos].item()))
+        return suspects
@@ -20,8 +20,8 @@
 from __future__ import print_function
 from __future__ import division
 
-import subprocess
 from datetime import datetime
+from cgroupwriter import CgroupWriter, read_file
 from mresource import Resource
 
 
@@ -36,8 +36,13 @@ class CpuQuota(Resource):
     CPU_SHARE_LC = 200000
     PREFIX = '/sys/fs/cgroup/cpu/'
 
-    def __init__(self, sysMaxUtil, minMarginRatio, verbose):
+    def __init__(self, sysMaxUtil, minMarginRatio, verbose, writer=None,
+                 reader=read_file):
         super(CpuQuota, self).__init__()
+        self.writer = CgroupWriter() if writer is None else writer
+        self.reader = reader
+        self.periods = {}
+        self.paths = {}
         self.min_margin_ratio = minMarginRatio
         self.update_max_sys_util(sysMaxUtil)
         self.update()
@@ -60,17 +65,26 @@ class CpuQuota(Resource):
         self.quota_max = lc_max_util * CpuQuota.CPU_QUOTA_PERCENT
         self.quota_step = self.quota_max / Resource.BUGET_LEV_MAX
 
-    @staticmethod
-    def __get_cfs_period(container):
-        path = CpuQuota.PREFIX + container.parent_path + container.con_path +\
-                '/cpu.cfs_period_us'
-        with open(path) as perdf:
-            res = perdf.readline()
+    def __cgroup_path(self, container):
+        path = self.paths.get(container.cid)
+        if path is None:
+            path = CpuQuota.PREFIX + container.parent_path +\
+                container.con_path
+            self.paths[container.cid] = path
+        return path
+
+    def __get_cfs_period(self, container):
+        period = self.periods.get(container.cid)
+        if period is not None:
+            return period
+        res = self.reader(self.__cgroup_path(container) +
+                          '/cpu.cfs_period_us')
         try:
             period = int(res)
-            return period
         except ValueError:
             return 0
+        self.periods[container.cid] = period
+        return period
 
     def __set_quota(self, container, quota):
         period = self.__get_cfs_period(container)
@@ -80,26 +94,34 @@ class CpuQuota(Resource):
         else:
             rquota = quota
 
-        path = CpuQuota.PREFIX + container.parent_path +\
-            container.con_path + '/cpu.cfs_quota_us'
-        with open(path, 'w') as shrf:
-            shrf.write(str(rquota))
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              container.name + ' cpu quota to ' + str(rquota))
+        path = self.__cgroup_path(container) + '/cpu.cfs_quota_us'
+        self.writer.write(path, rquota, 'container ' + container.name +
+                          ' cpu quota to ' + str(rquota))
 
-    @staticmethod
-    def set_share(container, share):
+    def set_share(self, container, share):
         """
-        Set CPU share in container
+        Set CPU share in container, the write is staged until flush
             share - given CPU share value
         """
-        path = CpuQuota.PREFIX + container.parent_path +\
-            container.con_path + '/cpu.shares'
-        with open(path, 'w') as shrf:
-            shrf.write(str(share))
+        path = self.__cgroup_path(container) + '/cpu.shares'
+        self.writer.write(path, share, 'container ' + container.name +
+                          ' cpu share to ' + str(share))
+
+    def flush(self):
+        """ write staged CPU quota and share changes of all containers """
+        done = self.writer.flush()
+        if done:
+            print(datetime.now().isoformat(' ') + ' set ' + ', '.join(done))
 
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              container.name + ' cpu share to ' + str(share))
+    def forget(self, cid):
+        """
+        Drop cached cgroup values of finished container
+            cid - container id
+        """
+        self.periods.pop(cid, None)
+        path = self.paths.pop(cid, None)
+        if path is not None:
+            self.writer.forget(path + '/')
 
     def budgeting(self, bes, lcs):
         newq = int(self.cpu_quota / len(bes))
@@ -108,6 +130,7 @@ class CpuQuota(Resource):
                 self.__set_quota(con, self.cpu_quota)
             else:
                 self.__set_quota(con, newq)
+        self.flush()
 
     def detect_margin_exceed(self, lc_utils, be_utils):
         """
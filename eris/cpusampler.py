@@ -0,0 +1,105 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements batched CPU usage sampling of all containers """
+
+import os
+
+from os.path import join as path_join
+from threading import Lock
+try:
+    from os import cpu_count
+except ImportError:
+    from multiprocessing import cpu_count
+
+
+class CpuUsage(object):
+    """ This class is one consistent CPU usage snapshot of all containers """
+
+    def __init__(self, system_usage, usages, cpu_no):
+        """
+        system_usage - system CPU time in nanoseconds read from /proc/stat
+        usages - container id to cpuacct.usage value map
+        cpu_no - logical processor count
+        """
+        self.system_usage = system_usage
+        self.usages = usages
+        self.cpu_no = cpu_no
+
+
+class CpuUsageSampler(object):
+    """
+    This class reads /proc/stat once per sample and cpuacct.usage of every
+    container with pread on file descriptors kept open between samples
+    """
+    PREFIX = '/sys/fs/cgroup/cpu'
+    STAT_READ_SIZE = 512
+    USAGE_READ_SIZE = 32
+
+    def __init__(self):
+        self.cpu_no = cpu_count()
+        self._stat_fd = os.open('/proc/stat', os.O_RDONLY)
+        self._fds = {}
+        self._lock = Lock()
+
+    def _usage_fd(self, con):
+        fd = self._fds.get(con.cid)
+        if fd is None:
+            fd = os.open(path_join(CpuUsageSampler.PREFIX, con.parent_path,
+                                   con.con_path, 'cpuacct.usage'),
+                         os.O_RDONLY)
+            self._fds[con.cid] = fd
+        return fd
+
+    def fd_count(self):
+        """ return count of file descriptors kept open """
+        return len(self._fds) + 1
+
+    def _close(self, cid):
+        fd = self._fds.pop(cid, None)
+        if fd is not None:
+            os.close(fd)
+
+    def sample(self, cons):
+        """
+        Take CPU usage snapshot of given containers, file descriptors of
+        containers not in the map are closed
+            cons - all containers, map from container id to Container
+        """
+        with self._lock:
+            for cid in [cid for cid in self._fds if cid not in cons]:
+                self._close(cid)
+
+            stat = os.pread(self._stat_fd, CpuUsageSampler.STAT_READ_SIZE, 0)
+            stats = stat.split(b'\n', 1)[0].split()[1:]
+            system_usage = sum(int(e) for e in stats) * 1e9 / 100
+
+            usages = {}
+            for cid, con in cons.items():
+                try:
+                    usages[cid] = int(os.pread(
+                        self._usage_fd(con), CpuUsageSampler.USAGE_READ_SIZE,
+                        0))
+                except (ValueError, OSError):
+                    self._close(cid)
+        return CpuUsage(system_usage, usages, self.cpu_no)
+
+    def close(self):
+        with self._lock:
+            for cid in list(self._fds):
+                self._close(cid)
+            os.close(self._stat_fd)
@@ -23,27 +23,34 @@ from __future__ import division
 import os
 import sys
 
-import time
 import traceback
 
 import docker
 import numpy as np
 
-from argparse import ArgumentParser, FileType
+from argparse import ArgumentParser, ArgumentTypeError, FileType
 from datetime import datetime
 try:
     from os import cpu_count
 except ImportError:
     from multiprocessing import cpu_count
-from threading import Thread
 
+from adaptive import AdaptiveInterval
+from cgroupwriter import read_file
 from container import Container, Contention
+from contender import ContenderIndex
 from cpuquota import CpuQuota
+from cpusampler import CpuUsageSampler
 from llcoccup import LlcOccup
+from metricbatch import burst_ratio, dominant_sockets, update_metrics
 from mresource import Resource
-from naivectrl import NaiveController
-from prometheus import PrometheusClient
-from pgos import Pgos
+from naivectrl import NaiveController, PerSocketController
+from prometheus import PrometheusClient, SnapshotCollector
+from pgos import EVENTS, MAX_EVENTS, Pgos, parse_event
+from recorder import Recorder, RecordFormat
+from registry import ContainerRegistry
+from resctrl import GroupMonitor, Resctrl
+from scheduler import Scheduler
 from analyze.analyzer import Metric, Analyzer, ThreshType
 
 __version__ = 0.8
@@ -63,10 +70,20 @@ class Context(object):
         self.lc_set = {}
         self.be_set = {}
         self.cpuq = None
-        self.llc = None
+        self.llcs = []
         self.controllers = {}
-        self.util_cons = dict()
-        self.metric_cons = dict()
+        self.group_monitors = {}
+        self.metric_interval = 0
+        self.metric_cycles = 0
+        self.contention_pending = False
+        self.adaptive = None
+        self.registry = None
+        self.scheduler = None
+        self.cpu_sampler = None
+        self.util_recorder = None
+        self.metric_recorder = None
+        self.util_cids = set()
+        self.metric_cids = set()
         self.analyzer = None
         self.cgroup_driver = 'cgroupfs'
 
@@ -83,72 +100,94 @@ class Context(object):
         return self._prometheus
 
 
-def detect_contender(metric_cons, contention_type, container_contended):
-    resource_delta_max = -np.Inf
-    suspect = "unknown"
-
-    for cid, container in metric_cons.items():
-        delta = 0
-        if cid == container_contended.cid:
-            continue
-        if contention_type == Contention.LLC:
-            delta = container.get_llcoccupany_delta()
-        elif contention_type == Contention.MEM_BW:
-            delta = container.get_latest_mbt()
-        elif contention_type == Contention.TDP:
-            delta = container.get_freq_delta()
-
-        if delta > 0 and delta > resource_delta_max:
-            resource_delta_max = delta
-            suspect = container.name
-
+def detect_contender(index, contention_type, container_contended, k=1):
+    """
+    Report suspects of resource contention, return suspects ranked by
+    resource usage
+        index - ContenderIndex of current metrics cycle
+        contention_type - contention type
+        container_contended - contended container
+        k - maximal number of suspects
+    """
+    suspects = index.top(contention_type, container_contended.cid, k)
+    names = ', '.join(name for name, _ in suspects) if suspects else 'unknown'
     print('Contention %s for container %s: Suspect is %s' %
-          (contention_type, container_contended.name, suspect))
+          (contention_type, container_contended.name, names))
+    return suspects
 
 
-def set_metrics(ctx, timestamp, data):
+def set_metrics(ctx, timestamp, data, index):
     """
     This function collect metrics from pgos tool and trigger resource
-    contention detection and control
+    contention detection and control, return True if contention is detected
+    or close to be detected
         ctx - agent context
-        data - metrics data collected from pgos
+        data - structured array of metrics collected from pgos
+        index - container id to row of data map
     """
-    for cid, metric in data:
-        container = ctx.metric_cons[cid]
-        container.metrics.update(metric)
+    metric_cons = ctx.registry.snapshot()
+    with ctx.prometheus.stage('cpu_sample'):
+        sample = ctx.cpu_sampler.sample(metric_cons)
+    for con in metric_cons.values():
+        con.update_metric_cpu_usage(sample)
+    cons = [con for cid, con in metric_cons.items() if cid in index]
+    if cons:
+        with ctx.prometheus.stage('derive_metrics'):
+            rows = data[[index[con.cid] for con in cons]]
+            raw = {metric: rows[field]
+                   for metric, field in Pgos.METRIC_FIELDS}
+            raw[Metric.UTIL] = np.array([con.metric_utils for con in cons])
+            update_metrics(cons, timestamp, raw, ctx.metric_interval)
+            for con in cons:
+                con.coverage = ctx.pgos.coverage[index[con.cid]]
+            if ctx.pgos.sockets > 1:
+                sockets = dominant_sockets(
+                    rows['socket_cycles'][:, :ctx.pgos.sockets])
+                for con, socket in zip(cons, sockets):
+                    con.socket = socket
+        set_event_metrics(ctx, cons, rows)
+        if ctx.pgos.sub_samples is not None and ctx.args.detect:
+            detect_bursts(cons, ctx.pgos.sub_samples[
+                [index[con.cid] for con in cons]], ctx.args.burst_ratio)
 
     contention = {
         Contention.LLC: False,
         Contention.MEM_BW: False,
         Contention.UNKN: False
     }
+    contended_sockets = dict((contend, set()) for contend in contention)
     contention_map = {}
     bes = []
     lcs = []
     findbe = False
-    for cid, con in ctx.metric_cons.items():
+    pressure = False
+    names = []
+    values = []
+    published = []
+    events = []
+    for cid, con in metric_cons.items():
         key = con.cid if ctx.args.key_cid else con.name
-        metrics = con.get_full_metrics(timestamp, ctx.args.metric_interval)
+        metrics = con.metrics if cid in index else None
         if metrics:
             if ctx.args.detect:
                 con.update_metrics_history()
 
             if ctx.args.record:
-                with open(Analyzer.METRIC_FILE, 'a') as metricf:
-                    metricf.write(str(con))
-
-                if ctx.args.enable_prometheus:
-                    ctx.prometheus.send_metrics(con.name, con.utils,
-                                                metrics[Metric.CYC],
-                                                metrics[Metric.L3MISS],
-                                                metrics[Metric.INST],
-                                                metrics[Metric.CPI],
-                                                metrics[Metric.L3MPKI],
-                                                metrics[Metric.MSPKI],
-                                                metrics[Metric.NF],
-                                                metrics[Metric.MBR] +
-                                                metrics[Metric.MBL],
-                                                metrics[Metric.L3OCC])
+                ctx.metric_recorder.record(con.get_record())
+
+        # BE containers not sampled in this cycle keep their latest sample
+        if ctx.args.enable_prometheus and (metrics or key in ctx.be_set and
+                                           con.metrics):
+            latest = con.metrics
+            names.append(con.name)
+            published.append(con)
+            values.append((latest[Metric.UTIL], latest[Metric.CYC],
+                           latest[Metric.L3MISS], latest[Metric.INST],
+                           latest[Metric.CPI], latest[Metric.L3MPKI],
+                           latest[Metric.MSPKI], latest[Metric.NF],
+                           latest[Metric.MBR] + latest[Metric.MBL],
+                           latest[Metric.L3OCC], con.coverage,
+                           timestamp - latest['time']))
 
         if key in ctx.lc_set:
             if ctx.args.exclusive_cat:
@@ -162,62 +201,122 @@ def set_metrics(ctx, timestamp, data):
                         if_contended = True
                         for contend in contend_res:
                             contention[contend] = True
+                            contended_sockets[contend].add(con.socket)
+                            events.append((con.name, contend.name))
 
                     tdp_contend = con.tdp_contention_detect()
                     if tdp_contend is not None:
                         if_contended = True
                         contention[tdp_contend] = True
+                        events.append((con.name, tdp_contend.name))
 
                     if if_contended:
                         contention_map[con] = contention.copy()
+                        pressure = True
+                    elif ctx.adaptive is not None and\
+                            con.cpi_ratio() >= AdaptiveInterval.CPI_RATIO:
+                        pressure = True
 
         if key in ctx.be_set:
             findbe = True
             bes.append(con)
 
-    if ctx.args.detect:
-        for container_contended, contention_list in contention_map.items():
-            for contention_type, contention_type_if_happened\
-                    in contention_list.items():
-                if contention_type_if_happened and\
-                   contention_type != Contention.UNKN:
-                    detect_contender(ctx.metric_cons, contention_type,
-                                     container_contended)
+    if ctx.args.detect and contention_map:
+        with ctx.prometheus.stage('detect_contender'):
+            contenders = ContenderIndex.from_containers(metric_cons)
+            for container_contended, contention_list in\
+                    contention_map.items():
+                for contention_type, contention_type_if_happened\
+                        in contention_list.items():
+                    if contention_type_if_happened and\
+                       contention_type != Contention.UNKN:
+                        detect_contender(contenders, contention_type,
+                                         container_contended,
+                                         ctx.args.suspects)
     if findbe and ctx.args.control:
-        for contention, flag in contention.items():
-            if contention in ctx.controllers:
-                ctx.controllers[contention].update(bes, lcs, flag, False)
-
-
-def remove_finished_containers(cids, consmap):
+        with ctx.prometheus.stage('metric_control'):
+            for contention, sockets in contended_sockets.items():
+                if contention in ctx.controllers:
+                    ctx.controllers[contention].update(bes, lcs, sockets,
+                                                       False)
+    if ctx.args.enable_prometheus:
+        if ctx.args.control:
+            send_controller_levels(ctx)
+        ctx.prometheus.send_metrics(names, np.array(values).reshape(
+            len(names), len(SnapshotCollector.CONTAINER_METRICS)))
+        send_event_metrics(ctx, published)
+        ctx.prometheus.send_contentions(events)
+        for group, monitor in ctx.group_monitors.items():
+            for dom, group_values in monitor.sample().items():
+                ctx.prometheus.send_group_metrics(group, dom, *group_values)
+    return pressure
+
+
+def send_controller_levels(ctx):
     """
-    remove finished containers from cached container map
-        cids - container id list from docker
-        mon_cons - cached container map
+    Publish current levels of all controllers to prometheus
+        ctx - agent context
     """
-    for cid in consmap.copy():
-        if cid not in cids:
-            del consmap[cid]
-
+    ctx.prometheus.send_levels(
+        [(contention.name, socket, level)
+         for contention, controller in ctx.controllers.items()
+         for socket, level in controller.levels()])
 
-def list_tids(pid):
-    tids = []
-    try:
-        tids = os.listdir('/proc/' + pid + '/task')
-    except Exception:
-        traceback.print_exc(file=sys.stdout)
-    return tids
 
-
-def list_pids(container):
+def set_event_metrics(ctx, cons, rows):
+    """
+    Keep extra perf events and running ratios of counter groups as latest
+    event sample of containers, and report containers whose counters are
+    multiplexed
+        ctx - agent context
+        cons - containers in order of rows
+        rows - structured array of metrics collected from pgos
     """
-    list all process id of one container
-        container - container object listed from Docker
+    count = len(ctx.pgos.events)
+    ratios = rows['ratio']
+    if ctx.args.verbose:
+        scaled = [con.name for con, ratio in zip(cons, ratios.tolist())
+                  if 0 < ratio < 1]
+        if scaled:
+            print('performance counters are multiplexed and scaled for ' +
+                  'container ' + ','.join(scaled))
+    for con, values, group_ratios in zip(
+            cons, rows['extra'][:, :count],
+            np.column_stack((ratios, rows['extra_ratio'][:, :count]))):
+        con.event_sample = (values, group_ratios)
+
+
+def send_event_metrics(ctx, cons):
     """
-    procs = container.top()['Processes']
-    pids = [pid[1] for pid in procs] if procs else []
-    return [tid for pid in pids
-            for tid in list_tids(pid)] if pids else []
+    Publish latest event sample of containers
+        ctx - agent context
+        cons - containers published in this cycle
+    """
+    count = len(ctx.pgos.events)
+    # samples taken before perf events change are not published
+    cons = [con for con in cons if con.event_sample is not None and
+            len(con.event_sample[0]) == count]
+    ctx.prometheus.send_events(
+        [con.name for con in cons], ctx.pgos.events,
+        np.array([con.event_sample[0] for con in cons]).reshape(
+            len(cons), count),
+        np.array([con.event_sample[1] for con in cons]).reshape(
+            len(cons), count + 1))
+
+
+def detect_bursts(cons, samples, threshold):
+    """
+    Report containers whose LLC misses burst within one metrics window,
+    bursts shorter than the window are averaged away in window metrics
+        cons - containers in order of samples
+        samples - sub-samples array of shape (containers, samples)
+        threshold - minimal ratio of peak rate to window rate reported
+    """
+    ratios = burst_ratio(samples, 'llc_misses')
+    for con, ratio in zip(cons, ratios.tolist()):
+        if ratio >= threshold:
+            print('LLC misses burst of container %s, peak rate is %.1f '
+                  'times window average' % (con.name, ratio))
 
 
 def mon_util_cycle(ctx):
@@ -231,31 +330,31 @@ def mon_util_cycle(ctx):
     date = datetime.now().isoformat()
     bes = []
     newbe = False
-    containers = ctx.docker_client.containers.list()
-    remove_finished_containers({c.id for c in containers}, ctx.util_cons)
-
-    for container in containers:
-        cid = container.id
-        name = container.name
-        pids = list_pids(container)
+    cons = ctx.registry.snapshot()
+    if ctx.args.control:
+        for cid in ctx.util_cids - set(cons):
+            ctx.cpuq.forget(cid)
+    ctx.util_cids &= set(cons)
+    ctx.prometheus.count_containers('util', len(cons))
+    with ctx.prometheus.stage('cpu_sample'):
+        sample = ctx.cpu_sampler.sample(cons)
+
+    for cid, con in cons.items():
+        name = con.name
         key = cid if ctx.args.key_cid else name
-        if cid in ctx.util_cons:
-            con = ctx.util_cons[cid]
-        else:
-            con = Container(ctx.cgroup_driver, cid, name, pids,
-                            ctx.args.verbose)
-            ctx.util_cons[cid] = con
+        if cid not in ctx.util_cids:
+            ctx.util_cids.add(cid)
             if ctx.args.control:
+                # cached values may belong to cgroup of a restarted container
+                ctx.cpuq.forget(cid)
                 if key in ctx.be_set:
                     newbe = True
                     ctx.cpuq.set_share(con, CpuQuota.CPU_SHARE_BE)
                 else:
                     ctx.cpuq.set_share(con, CpuQuota.CPU_SHARE_LC)
-        con.update_cpu_usage()
+        con.update_cpu_usage(sample)
         if ctx.args.record:
-            with open(Analyzer.UTIL_FILE, 'a') as utilf:
-                utilf.write(date + ',' + cid + ',' + name +
-                            ',' + str(con.utils) + '\n')
+            ctx.util_recorder.record((date, cid, name, con.utils))
 
         if key in ctx.lc_set:
             lc_utils = lc_utils + con.utils
@@ -265,11 +364,14 @@ def mon_util_cycle(ctx):
             be_utils = be_utils + con.utils
             bes.append(con)
 
+    if ctx.args.control:
+        with ctx.prometheus.stage('cpu_share'):
+            ctx.cpuq.flush()
+
     loadavg = os.getloadavg()[0]
     if ctx.args.record:
-        with open(Analyzer.UTIL_FILE, 'a') as utilf:
-            utilf.write(date + ',,lcs,' + str(lc_utils) + '\n')
-            utilf.write(date + ',,loadavg1m,' + str(loadavg) + '\n')
+        ctx.util_recorder.record((date, '', 'lcs', lc_utils))
+        ctx.util_recorder.record((date, '', 'loadavg1m', loadavg))
 
     if lc_utils > ctx.sysmax_util:
         ctx.sysmax_util = lc_utils
@@ -278,78 +380,146 @@ def mon_util_cycle(ctx):
             ctx.cpuq.update_max_sys_util(lc_utils)
 
     if newbe:
-        ctx.cpuq.budgeting(bes, [])
+        with ctx.prometheus.stage('cpu_budgeting'):
+            ctx.cpuq.budgeting(bes, [])
 
     if findbe and ctx.args.control:
         exceed, hold = ctx.cpuq.detect_margin_exceed(lc_utils, be_utils)
         if not ctx.args.enable_hold:
             hold = False
-        ctx.controllers[Contention.CPU_CYC].update(bes, [], exceed, hold)
+        with ctx.prometheus.stage('util_control'):
+            ctx.controllers[Contention.CPU_CYC].update(bes, [], exceed, hold)
+    if ctx.args.control and ctx.args.enable_prometheus:
+        send_controller_levels(ctx)
 
 
-def mon_metric_cycle(ctx):
+def sync_pgos_cgroups(pgos, newcgroups, removed, cpus):
     """
-    Platform metrics monitor timer function
+    Open perf events of new containers and close those of removed ones in
+    libpgos fd pool
+        pgos - Pgos wrapper
+        newcgroups - list of container id and cgroup path tuple
+        removed - container ids removed from registry
+        cpus - map from container id to its cpuset cpus
+    """
+    for cid in removed:
+        pgos.remove_cgroup(cid)
+    for cid, path in newcgroups:
+        ret = pgos.add_cgroup(cid, path, cpus.get(cid))
+        if ret != 0:
+            print('error in open perf events for container: ' + cid +
+                  ', error code: ' + str(ret))
+
+
+async def mon_metric_cycle(ctx):
+    """
+    Platform metrics monitor timer function, metrics collection is blocking
+    and runs in scheduler executor
         ctx - agent context
     """
-    containers = ctx.docker_client.containers.list()
     cgroups = []
+    newcgroups = []
+    priority = []
+    cpus = {}
     bes = []
     lcs = []
     newcon = False
     newbe = False
-    remove_finished_containers({c.id for c in containers}, ctx.metric_cons)
-
-    for container in containers:
-        cid = container.id
-        name = container.name
-        pids = list_pids(container)
+    pressure = False
+    sample = None
+    cons = ctx.registry.snapshot()
+    # BE metrics are only used in contender detection, they are collected
+    # every be_sample_cycles cycles and while LC contention is pending
+    sample_be = ctx.contention_pending or\
+        ctx.metric_cycles % ctx.args.be_sample_cycles == 0
+    ctx.metric_cycles += 1
+    removed = ctx.metric_cids - set(cons)
+    ctx.metric_cids &= set(cons)
+    ctx.prometheus.count_containers('metric', len(cons))
+
+    pids_added = {}
+    with ctx.prometheus.stage('update_pids'):
+        for cid, con in cons.items():
+            try:
+                pids_added[cid] = con.update_pids()[0]
+            except (ValueError, IOError):
+                if ctx.args.verbose:
+                    traceback.print_exc(file=sys.stdout)
+
+    for cid, con in cons.items():
+        if cid not in pids_added:
+            continue
+        name = con.name
+        added = pids_added[cid]
         key = cid if ctx.args.key_cid else name
-        if cid in ctx.metric_cons:
-            con = ctx.metric_cons[cid]
-            con.update_pids(pids)
-        else:
-            thresh = ctx.analyzer.get_thresh(key, ThreshType.METRICS)
-            tdp_thresh = ctx.analyzer.get_thresh(key, ThreshType.TDP)
-            con = Container(ctx.cgroup_driver, cid, name, pids,
-                            ctx.args.verbose, thresh, tdp_thresh)
-            ctx.metric_cons[cid] = con
-            con.update_cpu_usage()
+        if cid not in ctx.metric_cids:
+            ctx.metric_cids.add(cid)
+            if sample is None:
+                sample = ctx.cpu_sampler.sample(cons)
+            con.update_metric_cpu_usage(sample)
             if ctx.args.control and not ctx.args.disable_cat:
                 newcon = True
                 if key in ctx.be_set:
                     newbe = True
         if key in ctx.lc_set:
+            priority.append(cid)
             if ctx.args.exclusive_cat:
                 lcs.append(con)
         if key in ctx.be_set:
             bes.append(con)
-        cgroups.append((cid, '/sys/fs/cgroup/perf_event/' +
-                        con.parent_path + con.con_path))
+            if added and ctx.args.control and not ctx.args.disable_cat:
+                newbe = True
+            if not sample_be:
+                continue
+        try:
+            # perf events are opened only on cpus of container cpuset
+            con.update_cpusets()
+        except (ValueError, IOError):
+            con.cpusets = []
+        cpus[cid] = con.cpusets
+        cgroup = (cid, '/sys/fs/cgroup/perf_event/' + con.parent_path +
+                  con.con_path)
+        if cid not in ctx.pgos.cgroups:
+            newcgroups.append(cgroup)
+        cgroups.append(cgroup)
     if newbe or newcon and bes and ctx.args.exclusive_cat:
-        ctx.llc.budgeting(bes, lcs)
-
+        with ctx.prometheus.stage('llc_budgeting'):
+            for llc in ctx.llcs:
+                llc.budgeting(bes, lcs)
+
+    if removed or newcgroups:
+        with ctx.prometheus.stage('pgos_sync'):
+            await ctx.scheduler.run_in_executor(sync_pgos_cgroups, ctx.pgos,
+                                                newcgroups, removed, cpus)
     if cgroups:
-        timestamp, data = ctx.pgos.collect(cgroups)
-        if data:
-            set_metrics(ctx, timestamp, data)
+        with ctx.prometheus.stage('pgos_collect'):
+            timestamp, data, index = await ctx.scheduler.run_in_executor(
+                ctx.pgos.collect, cgroups, priority, cpus)
+        if index:
+            with ctx.prometheus.stage('set_metrics'):
+                pressure = set_metrics(ctx, timestamp, data, index)
 
+    ctx.contention_pending = pressure
+    if ctx.adaptive is not None:
+        adapt_metric_interval(ctx, pressure)
 
-def monitor(func, ctx, interval):
+
+def adapt_metric_interval(ctx, pressure):
     """
-    wrap schedule timer function
+    Change metrics collection interval based on detection state and agent
+    overhead of finished cycle
         ctx - agent context
-        interval - timer interval
+        pressure - contention is detected or close in finished cycle
     """
-    next_time = time.time()
-    while not ctx.shutdown:
-        func(ctx)
-        while True:
-            next_time += interval
-            delta = next_time - time.time()
-            if delta > 0:
-                break
-        time.sleep(delta)
+    interval = ctx.adaptive.update(pressure)
+    if interval == ctx.metric_interval:
+        return
+    if ctx.args.verbose:
+        print(datetime.now().isoformat(' ') + ' metric interval is changed ' +
+              'from ' + str(ctx.metric_interval) + ' to ' + str(interval))
+    ctx.metric_interval = interval
+    ctx.scheduler.set_interval('metric', interval)
+    ctx.pgos.set_period(interval * 1000 - 1500)
 
 
 def init_wlset(ctx):
@@ -383,6 +553,20 @@ def init_sysmax(ctx):
         print(ctx.sysmax_util)
 
 
+def new_container(ctx, cid, name):
+    """
+    Create Container object for container registry
+        ctx - agent context
+        cid - container id
+        name - container name
+    """
+    key = cid if ctx.args.key_cid else name
+    thresh = ctx.analyzer.get_thresh(key, ThreshType.METRICS)
+    tdp_thresh = ctx.analyzer.get_thresh(key, ThreshType.TDP)
+    return Container(ctx.cgroup_driver, cid, name, [], ctx.args.verbose,
+                     thresh, tdp_thresh, ctx.args.history_depth)
+
+
 def detect_cgroup_driver():
     """
     Detect docker cgroup parent dir based on cgroup driver type
@@ -393,8 +577,24 @@ def detect_cgroup_driver():
     return cgroup_driver
 
 
-def parse_arguments():
-    """ agent command line arguments parse function """
+def perf_events(value):
+    """
+    Parse comma separated perf event specs of command line argument
+        value - argument value
+    """
+    events = [event.strip() for event in value.split(',') if event.strip()]
+    if len(events) > MAX_EVENTS:
+        raise ArgumentTypeError('at most ' + str(MAX_EVENTS) + ' events')
+    for event in events:
+        try:
+            parse_event(event)
+        except ValueError as err:
+            raise ArgumentTypeError(str(err))
+    return events
+
+
+def build_parser():
+    """ build agent command line arguments parser """
 
     parser = ArgumentParser(description='eris agent monitor\
                             container CPU utilization and platform\
@@ -441,28 +641,149 @@ def parse_arguments():
                         type=float, default=0.5)
     parser.add_argument('-t', '--thresh-file', help='threshold model file build\
                         from analyze.py tool', default=Analyzer.THRESH_FILE)
+    parser.add_argument('--reconcile-interval', help='interval in seconds to\
+                        reconcile container registry with Docker container\
+                        list', type=int, default=60)
+    parser.add_argument('--record-format', help='format of recorded data\
+                        file, binary format is fixed width records, container\
+                        names longer than 64 bytes are truncated',
+                        choices=[RecordFormat.CSV, RecordFormat.BINARY],
+                        default=RecordFormat.CSV)
+    parser.add_argument('--record-rotate-size', help='rotate recorded data\
+                        file when its size exceeds given MB, 0 disables size\
+                        based rotation', type=int, default=0)
+    parser.add_argument('--record-rotate-interval', help='rotate recorded data\
+                        file after given seconds, 0 disables time based\
+                        rotation', type=int, default=0)
+    parser.add_argument('--continuous-counting', help='keep performance\
+                        counters enabled and collect delta since previous\
+                        metrics cycle instead of counting in a window',
+                        action='store_true')
+    parser.add_argument('--suspects', help='maximal number of suspects\
+                        reported for one resource contention', type=int,
+                        default=3)
+    parser.add_argument('--history-depth', help='number of previous metrics\
+                        cycles compared with current one in contender\
+                        detection', type=int, default=5)
+    parser.add_argument('--per-socket', help='control LLC of best-efforts\
+                        tasks on every socket separately, only sockets where\
+                        contention of latency-critical tasks is detected are\
+                        throttled', action='store_true')
+    parser.add_argument('--perf-events', help='comma separated extra perf\
+                        events counted for every container, each is a named\
+                        event (' + ', '.join(sorted(EVENTS)) + ') or\
+                        TYPE:CONFIG of perf_event_open, e.g. 4:0x01c2',
+                        type=perf_events, default=[])
+    parser.add_argument('--adaptive-interval', help='shorten platform metrics\
+                        monitor interval when contention is detected or close,\
+                        and lengthen it when workloads are stable or agent\
+                        overhead exceeds CPU budget', action='store_true')
+    parser.add_argument('--min-metric-interval', help='minimal platform\
+                        metrics monitor interval in adaptive mode', type=int,
+                        choices=range(2, 61), default=2)
+    parser.add_argument('--max-metric-interval', help='maximal platform\
+                        metrics monitor interval in adaptive mode', type=int,
+                        choices=range(2, 601), default=60)
+    parser.add_argument('--cpu-budget', help='agent CPU usage budget in\
+                        percentage of one logical processor in adaptive mode',
+                        type=float, default=5.0)
+    parser.add_argument('--sub-samples', help='number of sub-samples read in\
+                        every platform metrics window without stopping\
+                        counters, short bursts of LLC misses are reported in\
+                        detection mode, ignored with --continuous-counting',
+                        type=int, default=0)
+    parser.add_argument('--burst-ratio', help='minimal ratio of peak\
+                        sub-sample LLC miss rate to window rate reported as\
+                        burst', type=float, default=4.0)
+    parser.add_argument('--be-sample-cycles', help='collect platform metrics\
+                        of best-efforts containers every given metrics\
+                        cycles, and in every cycle while contention of\
+                        latency-critical containers is pending', type=int,
+                        choices=range(1, 61), default=1)
+    return parser
+
+
+def parse_arguments():
+    """ agent command line arguments parse function """
 
+    parser = build_parser()
     args = parser.parse_args()
+    if args.adaptive_interval and not args.min_metric_interval <=\
+            args.metric_interval <= args.max_metric_interval:
+        parser.error('metric interval must be between minimal and maximal '
+                     'metric interval in adaptive mode')
     if args.verbose:
         print(args)
     return args
 
-def init_data_file(ctx, data_file, cols):
-    headline = None
-    try:
-        with open(data_file, 'r') as dtf:
-            headline = dtf.readline()
-    except Exception:
-        if ctx.args.verbose:
-            traceback.print_exc(file=sys.stdout)
-    if headline != ','.join(cols) + '\n':
-        with open(data_file, 'w') as dtf:
-            dtf.write(','.join(cols) + '\n')
+
+def init_recorder(ctx, data_file, cols):
+    """
+    Create and start recorder of given data file
+        ctx - agent context
+        data_file - default csv data file path
+        cols - column names of data file
+    """
+    if ctx.args.record_format == RecordFormat.BINARY:
+        data_file = os.path.splitext(data_file)[0] + '.bin'
+    recorder = Recorder(data_file, cols, ctx.args.record_format,
+                        ctx.args.record_rotate_size * 1024 * 1024,
+                        ctx.args.record_rotate_interval,
+                        verbose=ctx.args.verbose)
+    recorder.start()
+    return recorder
+
+
+def init_llc_controller(ctx, resctrl):
+    """
+    Create LLC resources and controller, one resource and controller per L3
+    domain if per socket control is enabled
+        ctx - agent context
+        resctrl - resctrl filesystem
+    """
+    domains = resctrl.domains('L3')
+    if not ctx.args.per_socket or len(domains) < 2:
+        ctx.llcs = [LlcOccup(Resource.BUGET_LEV_MIN, ctx.args.exclusive_cat,
+                             resctrl)]
+        return NaiveController(ctx.llcs[0], ctx.args.llc_cycles)
+
+    # socket index of containers follows order of L3 domain ids
+    ctx.llcs = [LlcOccup(Resource.BUGET_LEV_MIN, ctx.args.exclusive_cat,
+                         resctrl, [dom]) for dom in domains]
+    ctx.group_monitors = dict(
+        (name, GroupMonitor(resctrl.group(name)))
+        for name in (LlcOccup.BE_GROUP, LlcOccup.LC_GROUP))
+    return PerSocketController([NaiveController(llc, ctx.args.llc_cycles)
+                                for llc in ctx.llcs])
+
+
+def init_controllers(ctx, resctrl=None, writer=None, reader=read_file):
+    """
+    Create CPU quota and LLC resources and their controllers
+        ctx - agent context
+        resctrl - resctrl filesystem, default is the one mounted in /sys
+        writer - CgroupWriter of CPU quota and share, default writes cgroup
+            control files
+        reader - callable reads first line of cgroup control file
+    """
+    if resctrl is None:
+        resctrl = Resctrl()
+    ctx.cpuq = CpuQuota(ctx.sysmax_util, ctx.args.margin_ratio,
+                        ctx.args.verbose, writer, reader)
+    quota_controller = NaiveController(ctx.cpuq, ctx.args.quota_cycles)
+    if ctx.args.disable_cat:
+        ctx.llcs = [LlcOccup(Resource.BUGET_LEV_FULL, False, resctrl)]
+        ctx.controllers = {Contention.CPU_CYC: quota_controller}
+    else:
+        ctx.controllers = {Contention.CPU_CYC: quota_controller,
+                           Contention.LLC: init_llc_controller(ctx, resctrl)}
+
 
 def main():
     """ Script entry point. """
     ctx = Context()
     ctx.args = parse_arguments()
+    ctx.metric_interval = ctx.args.metric_interval
     ctx.cgroup_driver = detect_cgroup_driver()
     ctx.analyzer = Analyzer(ctx.args.workload_conf_file,
                             ctx.args.thresh_file)
@@ -473,22 +794,21 @@ def main():
         ctx.prometheus.start()
 
     if ctx.args.control:
-        ctx.cpuq = CpuQuota(ctx.sysmax_util, ctx.args.margin_ratio,
-                            ctx.args.verbose)
-        quota_controller = NaiveController(ctx.cpuq, ctx.args.quota_cycles)
-        ctx.llc = LlcOccup(Resource.BUGET_LEV_MIN, ctx.args.exclusive_cat)
-        llc_controller = NaiveController(ctx.llc, ctx.args.llc_cycles)
-        if ctx.args.disable_cat:
-            ctx.llc = LlcOccup(Resource.BUGET_LEV_FULL, exclusive=False)
-            ctx.controllers = {Contention.CPU_CYC: quota_controller}
-        else:
-            ctx.controllers = {Contention.CPU_CYC: quota_controller,
-                               Contention.LLC: llc_controller}
+        init_controllers(ctx)
+    ctx.cpu_sampler = CpuUsageSampler()
+    ctx.registry = ContainerRegistry(
+        ctx.docker_client, lambda cid, name: new_container(ctx, cid, name),
+        ctx.args.reconcile_interval, ctx.args.verbose, ctx.prometheus.stage,
+        # cpu share is applied again to cgroup of restarted container
+        ctx.util_cids.discard)
+    ctx.registry.start()
+
     if ctx.args.record:
         cols = ['time', 'cid', 'name', Metric.UTIL]
-        init_data_file(ctx, Analyzer.UTIL_FILE, cols)
-    threads = [Thread(target=monitor, args=(mon_util_cycle,
-                                            ctx, ctx.args.util_interval))]
+        ctx.util_recorder = init_recorder(ctx, Analyzer.UTIL_FILE, cols)
+    ctx.scheduler = Scheduler(ctx, ctx.args.verbose,
+                              ctx.prometheus.observe_cycle)
+    ctx.scheduler.add_task('util', mon_util_cycle, ctx.args.util_interval)
 
     if ctx.args.collect_metrics:
         if ctx.args.record:
@@ -497,29 +817,36 @@ def main():
                     Metric.UTIL, Metric.L3OCC, Metric.MBL, Metric.MBR,
                     Metric.L2STALL, Metric.MEMSTALL, Metric.L2SPKI,
                     Metric.MSPKI]
-            init_data_file(ctx, Analyzer.METRIC_FILE, cols)
-        ctx.pgos = Pgos(cpu_count(), ctx.args.metric_interval * 1000 - 1500)
+            ctx.metric_recorder = init_recorder(ctx, Analyzer.METRIC_FILE,
+                                                cols)
+        ctx.pgos = Pgos(cpu_count(), ctx.args.metric_interval * 1000 - 1500,
+                        ctx.args.continuous_counting, ctx.args.perf_events,
+                        ctx.args.sub_samples, ctx.cpu_sampler.fd_count)
+        if ctx.args.adaptive_interval:
+            ctx.adaptive = AdaptiveInterval(ctx.args.metric_interval,
+                                            ctx.args.min_metric_interval,
+                                            ctx.args.max_metric_interval,
+                                            ctx.args.cpu_budget)
         ret = ctx.pgos.init_pgos()
         if ret != 0:
             print('error in libpgos init, error code: ' + str(ret))
         else:
             ctx.pgos_inited = True
-        threads.append(Thread(target=monitor,
-                              args=(mon_metric_cycle,
-                                    ctx, ctx.args.metric_interval)))
-
-    for thread in threads:
-        thread.start()
+        ctx.scheduler.add_task('metric', mon_metric_cycle,
+                               ctx.args.metric_interval)
 
     print('eris agent version', __version__, 'is started!')
 
     try:
-        for thread in threads:
-            thread.join()
+        ctx.scheduler.run()
     except KeyboardInterrupt:
         print('Shutdown eris agent ...exiting')
         if ctx.pgos_inited:
             ctx.pgos.fin_pgos()
+        ctx.registry.stop()
+        for recorder in (ctx.util_recorder, ctx.metric_recorder):
+            if recorder is not None:
+                recorder.stop()
         ctx.shutdown = True
     except Exception:
         traceback.print_exc(file=sys.stdout)
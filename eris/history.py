@@ -0,0 +1,80 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements fixed size metrics history of one container """
+
+from __future__ import division
+
+import numpy as np
+
+
+class MetricHistory(object):
+    """
+    This class keeps the most recent metrics in a ring buffer with one column
+    per metric. Column sums are maintained on append, so delta of latest
+    value from mean of older values is computed in constant time
+    """
+
+    def __init__(self, columns, depth):
+        """
+        columns - metric names, one column per metric
+        depth - maximal number of entries kept
+        """
+        self.columns = dict((col, i) for i, col in enumerate(columns))
+        self.depth = depth
+        self.data = np.zeros((depth, len(columns)))
+        self.sums = np.zeros(len(columns))
+        self.count = 0
+        self.pos = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values):
+        """
+        Append one entry, the oldest entry is dropped if history is full
+            values - metric values in order of columns
+        """
+        row = self.data[self.pos]
+        if self.count == self.depth:
+            self.sums -= row
+        else:
+            self.count += 1
+        row[:] = values
+        self.sums += row
+        self.pos = (self.pos + 1) % self.depth
+        if self.pos == 0:
+            # recompute sums once per round to drop accumulated float error
+            self.sums = self.data[:self.count].sum(axis=0)
+
+    def latest(self, column):
+        """ return latest value of column, 0 if history is empty """
+        if self.count == 0:
+            return 0
+        return self.data[self.pos - 1, self.columns[column]].item()
+
+    def delta(self, column):
+        """
+        return delta of latest value of column from mean of older values,
+        latest value if history has one entry and 0 if it is empty
+        """
+        if self.count < 2:
+            return self.latest(column)
+        col = self.columns[column]
+        latest = self.data[self.pos - 1, col].item()
+        older = self.sums[col].item() - latest
+        return latest - older / (self.count - 1)
@@ -15,20 +15,32 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-""" This module implements last level cache control based on pqos tool """
+""" This module implements last level cache control based on resctrl """
 
 from __future__ import print_function
 
-import subprocess
+import sys
+import traceback
+
 from datetime import datetime
 from mresource import Resource
+from resctrl import Resctrl
 
 
 class LlcOccup(Resource):
     """ This class is the resource class of LLC occupancy """
+    BE_GROUP = 'BE_Group'
+    LC_GROUP = 'LC_Group'
 
-    def __init__(self, init_level, exclusive):
-        bitcnt = LlcOccup._get_cbm_bit_count()
+    def __init__(self, init_level, exclusive, resctrl=None, domains=None):
+        """
+        init_level - initial resource level
+        exclusive - use exclusive bitmasks for BE and LC
+        resctrl - resctrl filesystem, default is the one mounted in /sys
+        domains - L3 domain ids controlled, default is all domains
+        """
+        self.resctrl = Resctrl() if resctrl is None else resctrl
+        bitcnt = bin(self.resctrl.cbm_mask()).count('1')
         self.be_bmp = [hex(((1 << (i + 1)) - 1) << (bitcnt - 1 - i))
                        for i in range(1, bitcnt)]
         self.lc_bmp = [hex((1 << (bitcnt - 1 - i)) - 1)
@@ -38,35 +50,47 @@ class LlcOccup(Resource):
             self.lc_bmp = self.lc_bmp[0:int(bitcnt / 2)]
         super(LlcOccup, self).__init__(init_level, int(bitcnt / 2) if
                                        exclusive else bitcnt - 1)
+        self.domains = self.resctrl.domains('L3') if domains is None\
+            else domains
+        self.cls_bmp = {}
 
-    @staticmethod
-    def _get_cbm_bit_count():
-        with open('/sys/fs/resctrl/info/L3/cbm_mask') as cbmf:
-            cbm_mask = cbmf.readline()
-            cbm = int(cbm_mask, 16)
-            cbm_bin = bin(cbm)
-            setbits = [bit for bit in cbm_bin[2:] if bit == '1']
-            return len(setbits)
-
-    def _budgeting(self, containers, clsid, is_be):
-        cpids = []
+    def _budgeting(self, containers, name, is_be):
+        """
+        Move thread ids into control group and set its bitmask on controlled
+        domains, only thread ids not moved yet are written, and bitmask is
+        only written when it differs from the one set in previous call
+        """
+        pids = set()
         cns = []
         for con in containers:
-            cpids.append(','.join(con.pids))
+            pids.update(con.pids)
             cns.append(con.name)
 
-        bmp = self.be_bmp if is_be else self.lc_bmp
-        cml = 'pqos -I -a' + '\'pid:' + clsid + '=' + ','.join(cpids) + '\''
-        subprocess.Popen(cml, shell=True)
+        group = self.resctrl.group(name)
+        failed = group.sync_tasks(pids)
+        if failed:
+            print('error in move threads ' + ','.join(failed) + ' into ' +
+                  name)
 
-        cml = 'pqos -e' + '\'llc:' + clsid + '=' + bmp[self.quota_level] + '\''
-        subprocess.Popen(cml, shell=True)
-
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              ','.join(cns) + ' llc occupancy to ' + bmp[self.quota_level])
+        bmp = self.be_bmp if is_be else self.lc_bmp
+        mask = bmp[self.quota_level]
+        if self.cls_bmp.get(name) != mask:
+            ok = group.write_schemata(
+                'L3', {dom: mask[2:] for dom in self.domains})
+            if not ok:
+                print('error in set ' + name + ' llc bitmask to ' + mask)
+                self.cls_bmp.pop(name, None)
+                return
+            self.cls_bmp[name] = mask
+            print(datetime.now().isoformat(' ') + ' set container ' +
+                  ','.join(cns) + ' llc occupancy to ' + mask +
+                  ' in L3 domain ' + ','.join(self.domains))
 
     def budgeting(self, bes, lcs):
-        if bes:
-            self._budgeting(bes, '1', True)
-        if lcs:
-            self._budgeting(lcs, '2', False)
+        try:
+            if bes:
+                self._budgeting(bes, LlcOccup.BE_GROUP, True)
+            if lcs:
+                self._budgeting(lcs, LlcOccup.LC_GROUP, False)
+        except (IOError, OSError):
+            traceback.print_exc(file=sys.stdout)
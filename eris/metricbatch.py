@@ -0,0 +1,99 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements derived metrics computation of all containers in one
+metrics cycle
+"""
+
+from __future__ import division
+
+import numpy as np
+
+from analyze.analyzer import Metric
+
+
+def _ratio(num, den, scale=1):
+    """ element wise num * scale / den, elements with zero den are 0 """
+    res = np.zeros(len(den))
+    np.divide(num * scale, den, out=res, where=den != 0)
+    return res
+
+
+def derive_metrics(raw, interval):
+    """
+    Compute derived metrics from raw metrics, every array holds one element
+    per container, return map from derived metric to array
+        raw - map from raw metric to array, contains INST, CYC, L3MISS,
+            L2STALL, MEMSTALL and UTIL
+        interval - metrics collection interval in seconds
+    """
+    inst = raw[Metric.INST].astype(np.float64)
+    cyc = raw[Metric.CYC].astype(np.float64)
+    utils = raw[Metric.UTIL].astype(np.float64)
+    return {
+        Metric.CPI: _ratio(cyc, inst),
+        Metric.L3MPKI: _ratio(raw[Metric.L3MISS], inst, 1000),
+        Metric.L2SPKI: _ratio(raw[Metric.L2STALL], inst, 1000),
+        Metric.MSPKI: _ratio(raw[Metric.MEMSTALL], inst, 1000),
+        Metric.NF: _ratio(cyc / interval / 10000, utils).astype(np.int64),
+    }
+
+
+def update_metrics(cons, timestamp, raw, interval):
+    """
+    Write raw and derived metrics of one cycle back into containers
+        cons - containers in order of raw metric arrays
+        timestamp - metrics collection timestamp
+        raw - map from raw metric to array, see derive_metrics
+        interval - metrics collection interval in seconds
+    """
+    columns = dict(raw)
+    columns.update(derive_metrics(raw, interval))
+    columns = [(metric, values.tolist()) for metric, values in columns.items()]
+    for i, con in enumerate(cons):
+        metrics = con.metrics
+        metrics['time'] = timestamp
+        for metric, values in columns:
+            metrics[metric] = values[i]
+
+
+def dominant_sockets(socket_cycles):
+    """
+    Return socket where most cycles of every container are spent, None for
+    containers without cycles
+        socket_cycles - cycles array of shape (containers, sockets)
+    """
+    sockets = socket_cycles.argmax(axis=1).tolist()
+    busy = (socket_cycles.sum(axis=1) > 0).tolist()
+    return [socket if active else None
+            for socket, active in zip(sockets, busy)]
+
+
+def burst_ratio(samples, field):
+    """
+    Return ratio of peak sub-sample rate of counter to its rate over whole
+    window for every container, 0 for containers without counts
+        samples - sub-samples array of shape (containers, samples)
+        field - counter field name of sub-samples
+    """
+    values = samples[field].astype(np.float64)
+    durations = samples['duration'].astype(np.float64)
+    rates = np.zeros(values.shape)
+    np.divide(values, durations, out=rates, where=durations != 0)
+    window = _ratio(values.sum(axis=1), durations.sum(axis=1))
+    return _ratio(rates.max(axis=1), window)
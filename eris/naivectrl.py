@@ -54,3 +54,36 @@ class NaiveController:
                     self.cyc_cnt = 0
                     self.res.increase_level()
                     self.res.budgeting(be_containers, lc_containers)
+
+    def levels(self):
+        """ return list of tuple of socket and current resource level """
+        return [('all', self.res.quota_level)]
+
+
+class PerSocketController:
+    """
+    This class runs one controller per socket, BE workloads are only
+    throttled on sockets where contention is detected
+    """
+
+    def __init__(self, controllers):
+        """
+        controllers - controller of every socket, indexed by socket
+        """
+        self.controllers = controllers
+
+    def update(self, be_containers, lc_containers, detected, hold):
+        """
+        Update contention detection result to controller of every socket
+            detected - sockets where resource contention detected, None in
+                the set means socket is unknown and all sockets are throttled
+            hold - if current resource level need to be maintained
+        """
+        for socket, controller in enumerate(self.controllers):
+            controller.update(be_containers, lc_containers,
+                              socket in detected or None in detected, hold)
+
+    def levels(self):
+        """ return list of tuple of socket and current resource level """
+        return [(str(socket), controller.res.quota_level)
+                for socket, controller in enumerate(self.controllers)]
@@ -17,14 +17,57 @@
 """ This module is a wrapper of libpgos and expose metrics monitor
 interface"""
 
+import resource
 import sys
 import traceback
 
-from ctypes import cdll, Structure
-from ctypes import c_char_p, c_ulonglong, c_double, c_int, POINTER
+from ctypes import cdll, sizeof, Array, Structure
+from ctypes import c_char, c_char_p, c_ulonglong, c_double, c_int, c_uint
+from ctypes import POINTER
+
+import numpy as np
+
 from analyze.analyzer import Metric
 
 
+MAX_SOCKETS = 8
+MAX_EVENTS = 16
+MAX_CPUS = 1024
+CPU_MASK_WORDS = MAX_CPUS // 64
+# RDT monitoring groups libpgos keeps at most, see MAX_PID_GROUP in pgos.c
+MAX_RMID_GROUPS = 100
+BASE_EVENTS = 5
+
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_RAW = 4
+
+# named events accepted in addition to TYPE:CONFIG specs
+EVENTS = {
+    'cache-references': (PERF_TYPE_HARDWARE, 2),
+    'branch-instructions': (PERF_TYPE_HARDWARE, 4),
+    'branch-misses': (PERF_TYPE_HARDWARE, 5),
+    'bus-cycles': (PERF_TYPE_HARDWARE, 6),
+    'stalled-cycles-frontend': (PERF_TYPE_HARDWARE, 7),
+    'stalled-cycles-backend': (PERF_TYPE_HARDWARE, 8),
+    'ref-cycles': (PERF_TYPE_HARDWARE, 9),
+    'topdown-slots': (PERF_TYPE_RAW, 0x0400),
+}
+
+
+def parse_event(spec):
+    """
+    Return tuple of perf event type and config of event spec, raise
+    ValueError if spec is neither a named event nor TYPE:CONFIG
+        spec - event name in EVENTS or TYPE:CONFIG, e.g. 4:0x01c2
+    """
+    if spec in EVENTS:
+        return EVENTS[spec]
+    if ':' not in spec:
+        raise ValueError('unknown perf event ' + spec)
+    perf_type, config = spec.split(':', 1)
+    return int(perf_type, 0), int(config, 0)
+
+
 class cgroup(Structure):
     _fields_ = [("ret", c_int),
                 ("path", c_char_p),
@@ -36,7 +79,196 @@ class cgroup(Structure):
                 ("stalls_memory_load", c_ulonglong),
                 ("llc_occupancy", c_ulonglong),
                 ("mbm_local", c_double),
-                ("mbm_remote", c_double)]
+                ("mbm_remote", c_double),
+                ("socket_instructions", c_ulonglong * MAX_SOCKETS),
+                ("socket_cycles", c_ulonglong * MAX_SOCKETS),
+                ("socket_llc_misses", c_ulonglong * MAX_SOCKETS),
+                ("socket_stalls_l2_misses", c_ulonglong * MAX_SOCKETS),
+                ("socket_stalls_memory_load", c_ulonglong * MAX_SOCKETS),
+                ("ratio", c_double),
+                ("extra", c_ulonglong * MAX_EVENTS),
+                ("extra_ratio", c_double * MAX_EVENTS),
+                ("cpu_mask", c_ulonglong * CPU_MASK_WORDS),
+                ("keep", c_int)]
+
+
+def cpu_mask(cpus):
+    """
+    Return words of cpu bitmask, empty mask means all cpus
+        cpus - logical processor ids, None or empty means all cpus
+    """
+    words = [0] * CPU_MASK_WORDS
+    for cpu in cpus or ():
+        if 0 <= cpu < MAX_CPUS:
+            words[cpu // 64] |= 1 << (cpu % 64)
+    return words
+
+
+def struct_dtype(struct):
+    """
+    Build NumPy type matches memory layout of ctypes structure, pointer
+    fields are exposed as unsigned integers and array fields as subarrays
+        struct - ctypes structure class
+    """
+    formats = {c_int: np.intc, c_char_p: np.uintp, c_ulonglong: np.ulonglong,
+               c_double: np.double}
+
+    def field_format(ctype):
+        if issubclass(ctype, Array):
+            return (formats[ctype._type_], (ctype._length_,))
+        return formats[ctype]
+
+    names = [name for name, _ in struct._fields_]
+    return np.dtype({
+        'names': names,
+        'formats': [field_format(ctype) for _, ctype in struct._fields_],
+        'offsets': [getattr(struct, name).offset for name in names],
+        'itemsize': sizeof(struct)})
+
+
+CGROUP_DTYPE = struct_dtype(cgroup)
+
+
+class sample(Structure):
+    _fields_ = [("timestamp", c_ulonglong),
+                ("duration", c_ulonglong),
+                ("instructions", c_ulonglong),
+                ("cycles", c_ulonglong),
+                ("llc_misses", c_ulonglong),
+                ("stalls_l2_misses", c_ulonglong),
+                ("stalls_memory_load", c_ulonglong),
+                ("extra", c_ulonglong * MAX_EVENTS)]
+
+
+SAMPLE_DTYPE = struct_dtype(sample)
+
+
+def rmid_count(root='/sys/fs/resctrl'):
+    """
+    Return RMIDs available for monitoring groups, MAX_RMID_GROUPS if
+    resctrl monitoring info is not available
+        root - resctrl filesystem mount point
+    """
+    try:
+        with open(root + '/info/L3_MON/num_rmids') as rmidf:
+            # RMID 0 is taken by default group
+            return min(int(rmidf.readline()) - 1, MAX_RMID_GROUPS)
+    except (IOError, ValueError):
+        return MAX_RMID_GROUPS
+
+
+class CounterBudget(object):
+    """
+    This class chooses cgroups counted in one collect when perf event fds or
+    RMIDs do not cover all of them. Priority cgroups are taken first, other
+    cgroups take the remaining budget in turn across windows with the least
+    recently counted first, every cgroup costs fds of its own cpus
+    """
+    FD_RESERVE = 64
+
+    def __init__(self, num_core, rmids=MAX_RMID_GROUPS, reserved=None):
+        """
+        num_core - logical processor count
+        rmids - RMIDs available for monitoring groups
+        reserved - optional callable returns count of fds kept open by the
+            agent per container, taken from fd budget besides FD_RESERVE
+        """
+        self.num_core = num_core
+        self.rmids = rmids
+        self.reserved = reserved
+        self.window = 0
+        self._last = {}
+        self._requested = {}
+        self.pending = set()
+
+    def limit(self, pqos=False):
+        """
+        Return tuple of perf event fds and cgroups available in one collect,
+        each is None if not limited
+            pqos - RDT monitoring is enabled
+        """
+        fds = None
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            reserved = self.reserved() if self.reserved is not None else 0
+            fds = max(soft - CounterBudget.FD_RESERVE - reserved, 0)
+        return fds, self.rmids if pqos else None
+
+    def cost(self, cpus, events):
+        """
+        Return perf event fds of one cgroup, one per event on every cpu it is
+        counted on and one of cgroup directory
+            cpus - logical processors events are opened on, empty means all
+            events - extra perf event count
+        """
+        return (len(cpus or ()) or self.num_core) * (BASE_EVENTS + events) + 1
+
+    def fit(self, cgps, costs, limit):
+        """
+        Return tuple of cgroups taken greedily in given order while they fit
+        in limit, and limit left
+            cgps - list of (container id, perf_event cgroup path) tuples
+            costs - map from container id to its perf event fds
+            limit - tuple of available fds and cgroups, see limit
+        """
+        fds, count = limit
+        fitted = []
+        for cgp in cgps:
+            if count is not None and len(fitted) >= count:
+                break
+            cost = costs[cgp[0]]
+            if fds is not None:
+                if cost > fds:
+                    continue
+                fds -= cost
+            fitted.append(cgp)
+        if count is not None:
+            count -= len(fitted)
+        return fitted, (fds, count)
+
+    def select(self, cgps, priority, costs, limit):
+        """
+        Return tuple of cgroups counted in next window and limit left
+            cgps - list of (container id, perf_event cgroup path) tuples
+            priority - container ids always counted
+            costs - map from container id to its perf event fds
+            limit - tuple of available fds and cgroups, see limit
+        """
+        self.window += 1
+        selected, left = self.fit(cgps, costs, limit)
+        if len(selected) == len(cgps):
+            return selected, left
+        first = [cgp for cgp in cgps if cgp[0] in priority]
+        rest = [cgp for cgp in cgps if cgp[0] not in priority]
+        # cgroups started in previous window without sample go first
+        rest.sort(key=lambda cgp: (cgp[0] not in self.pending,
+                                   self._last.get(cgp[0], -1)))
+        return self.fit(first + rest, costs, limit)
+
+    def update(self, cids, index, pending, requested):
+        """
+        Record result of collect, return map from container id in index to
+        coverage, the share of windows requested since its previous result
+        which is covered by current result. Windows the cgroup is not
+        requested in are left to the caller and do not lower coverage
+            cids - container ids of all known cgroups, counted or not
+            index - container id to row index map of collected cgroups
+            pending - container ids started in this window without sample
+            requested - container ids requested in this window
+        """
+        # windows without sample after start are not short of budget
+        for cid in set(requested) - set(pending):
+            self._requested[cid] = self._requested.get(cid, 0) + 1
+        coverage = {}
+        for cid in index:
+            coverage[cid] = 1 / self._requested.pop(cid, 1)
+            self._last[cid] = self.window
+        for cid in set(self._last) - set(cids):
+            del self._last[cid]
+        for cid in set(self._requested) - set(cids):
+            del self._requested[cid]
+        self.pending = set(pending)
+        return coverage
 
 
 class context(Structure):
@@ -45,63 +277,271 @@ class context(Structure):
                 ("period", c_int),
                 ("cgroup_count", c_int),
                 ("timestamp", c_ulonglong),
-                ("cgroups", POINTER(cgroup))]
+                ("cgroups", POINTER(cgroup)),
+                ("samples", c_int),
+                ("sample_buf", POINTER(sample))]
 
 
 class Pgos(object):
     """ This class wraps libpgos interface and provide eris friendly method """
+    ERROR_NO_PREVIOUS_SAMPLE = 16
+    INITIAL_CAPACITY = 16
+    METRIC_FIELDS = [(Metric.INST, 'instructions'),
+                     (Metric.CYC, 'cycles'),
+                     (Metric.L3MISS, 'llc_misses'),
+                     (Metric.L2STALL, 'stalls_l2_misses'),
+                     (Metric.MEMSTALL, 'stalls_memory_load'),
+                     (Metric.L3OCC, 'llc_occupancy'),
+                     (Metric.MBL, 'mbm_local'),
+                     (Metric.MBR, 'mbm_remote')]
+    SOCKET_FIELDS = [(Metric.INST, 'socket_instructions'),
+                     (Metric.CYC, 'socket_cycles'),
+                     (Metric.L3MISS, 'socket_llc_misses'),
+                     (Metric.L2STALL, 'socket_stalls_l2_misses'),
+                     (Metric.MEMSTALL, 'socket_stalls_memory_load')]
 
-    def __init__(self, num_core, period):
+    def __init__(self, num_core, period, continuous=False, events=None,
+                 samples=0, reserved=None):
+        """
+        num_core - logical processor count
+        period - counting window in milliseconds, unused in continuous mode
+        continuous - keep counters enabled between collect calls, each call
+            returns delta since previous call without sleeping
+        events - extra perf event specs counted in extra groups, see
+            parse_event, values are in extra field in order of specs
+        samples - number of sub-samples read in every counting window, less
+            than 2 disables sub-sampling, unused in continuous mode
+        reserved - optional callable returns count of fds kept open by the
+            agent per container, see CounterBudget
+        """
         lib = cdll.LoadLibrary('./libpgos.so')
         lib.collect.argtypes = [context]
         lib.collect.restype = context
+        lib.collect_continuous.argtypes = [context]
+        lib.collect_continuous.restype = context
+        lib.pgos_add_cgroup.argtypes = [c_char_p, c_char_p, c_int,
+                                        POINTER(c_ulonglong)]
+        lib.pgos_add_cgroup.restype = c_int
+        lib.pgos_remove_cgroup.argtypes = [c_char_p]
+        lib.pgos_remove_cgroup.restype = None
+        lib.pgos_socket_count.argtypes = [c_int]
+        lib.pgos_socket_count.restype = c_int
+        lib.pgos_set_events.argtypes = [c_int, POINTER(c_uint),
+                                        POINTER(c_ulonglong)]
+        lib.pgos_set_events.restype = c_int
         self.lib = lib
+        self.cgroups = {}
+        self.cpus = {}
+        self._pooled = set()
+        self.continuous = continuous
+        self.pqos = False
+        self.budget = CounterBudget(num_core, rmid_count(), reserved)
+        self.coverage = np.zeros(0)
         ctx = context()
         ctx.core = num_core
         ctx.period = period
+        ctx.samples = 0 if continuous or samples < 2 else samples
         self.ctx = ctx
+        self.samples = ctx.samples
+        self.sockets = lib.pgos_socket_count(num_core)
+        self.events = []
+        if events:
+            self.set_events(events)
+        self._capacity = 0
+        self._array = None
+        self._rows = []
+        self._view = None
+        self._sample_array = None
+        self._sample_view = None
+        self.sub_samples = None
+        self._reserve(Pgos.INITIAL_CAPACITY)
+
+    def set_period(self, period):
+        """
+        Change counting window of collect
+            period - counting window in milliseconds
+        """
+        self.ctx.period = period
+
+    def set_events(self, events):
+        """
+        Set extra perf events, pooled cgroups are opened again with new
+        events, return libpgos error code
+            events - extra perf event specs, see parse_event
+        """
+        specs = [parse_event(event) for event in events]
+        count = len(specs)
+        ret = self.lib.pgos_set_events(
+            count, (c_uint * count)(*[spec[0] for spec in specs]),
+            (c_ulonglong * count)(*[spec[1] for spec in specs]))
+        if ret != 0:
+            print('error in set perf events ' + ','.join(events) +
+                  ', error code: ' + str(ret))
+            return ret
+        self.events = list(events)
+        # libpgos closes all pooled cgroups when events change
+        self._pooled = set()
+        return ret
 
     def init_pgos(self):
-        return self.lib.pgos_init()
+        ret = self.lib.pgos_init()
+        self.pqos = ret == 0
+        return ret
 
     def fin_pgos(self):
         self.lib.pgos_finalize()
 
-    def collect(self, cgps):
+    def add_cgroup(self, cid, path, cpus=None):
+        """
+        Open perf events of cgroup in libpgos fd pool ahead of collect, the
+        cgroup is opened by collect instead if fd pool is full
+            cid - container id
+            path - perf_event cgroup path
+            cpus - logical processors events are opened on, None means all
+        """
+        self.cgroups[cid] = path
+        self.cpus[cid] = tuple(cpus or ())
+        fds, count = self.budget.limit(self.pqos)
+        if count is not None and len(self._pooled) >= count:
+            return 0
+        costs = self._costs(self._pooled | set([cid]))
+        if fds is not None and sum(costs.values()) > fds:
+            return 0
+        ret = self.lib.pgos_add_cgroup(
+            path.encode(), cid.encode(), self.ctx.core,
+            (c_ulonglong * CPU_MASK_WORDS)(*cpu_mask(cpus)))
+        if ret == 0:
+            self._pooled.add(cid)
+        return ret
+
+    def _costs(self, cids):
+        """ Return map from container id to perf event fds of its cgroup """
+        events = len(self.events)
+        return dict((cid, self.budget.cost(self.cpus.get(cid), events))
+                    for cid in cids)
+
+    def remove_cgroup(self, cid):
+        """
+        Close perf events of cgroup in libpgos fd pool
+            cid - container id
+        """
+        path = self.cgroups.pop(cid, None)
+        self.cpus.pop(cid, None)
+        if path is not None:
+            self._pooled.discard(cid)
+            self.lib.pgos_remove_cgroup(path.encode())
+
+    def _reserve(self, count):
+        """
+        Make sure the reusable cgroup array holds at least count rows, the
+        array grows by doubling and rows are reassigned after growing
+        """
+        if count <= self._capacity:
+            return
+        capacity = max(count, self._capacity * 2, Pgos.INITIAL_CAPACITY)
+        array = (cgroup * capacity)()
+        self._array = array
+        self._rows = [None] * capacity
+        self._capacity = capacity
+        self._view = np.frombuffer((c_char * sizeof(array)).from_buffer(array),
+                                   dtype=CGROUP_DTYPE)
+        self.ctx.cgroups = array
+        if self.samples:
+            # sub-samples of row i are at i * samples .. (i + 1) * samples
+            sample_array = (sample * (capacity * self.samples))()
+            self._sample_array = sample_array
+            self._sample_view = np.frombuffer(
+                (c_char * sizeof(sample_array)).from_buffer(sample_array),
+                dtype=SAMPLE_DTYPE).reshape(capacity, self.samples)
+            self.ctx.sample_buf = sample_array
+
+    def collect(self, cgps, priority=(), cpus=None):
+        """
+        Collect metrics of cgroups, return tuple of timestamp, structured
+        array of collected rows and container id to row index map. The
+        array is a view of memory shared with libpgos and is only valid
+        until next collect call, rows not in the index map failed or were
+        not counted in this window. When sub-sampling is enabled,
+        sub_samples is set to structured array of shape (rows, samples) in
+        the same row order, every sub-sample holds counter deltas, monotonic
+        timestamp and measured duration in ns. Cgroups beyond perf event fd
+        or RMID budget are counted in turn across windows, coverage is set
+        to array of share of windows requested since previous result
+        covered by every row, 0 for rows not in the index map. Cgroups
+        started without sample in previous continuous collect are counted
+        again even if not requested, so that they get their first delta.
+        Pooled cgroups not requested stay in libpgos fd pool without being
+        read while the budget allows, in continuous mode counts of their next
+        read are scaled to the window of that collect
+            cgps - list of (container id, perf_event cgroup path) tuples
+            priority - container ids counted in every window
+            cpus - map from container id to logical processors events are
+                opened on, cgroups not in the map keep their previous cpus,
+                which are all cpus by default
+        """
         ctx = self.ctx
-        ctx.cgroup_count = len(cgps)
-        cg_array = []
-        for cgp in cgps:
-            cg = cgroup()
-            cg.cid = cgp[0].encode()
-            cg.path = cgp[1].encode()
-            cg_array.append(cg)
-        ctx.cgroups = (cgroup * len(cgps))(* cg_array)
-        metrics = []
+        # cgroups not requested in this collect are kept until removed
+        self.cgroups.update(cgps)
+        for cid, cgroup_cpus in (cpus or {}).items():
+            self.cpus[cid] = tuple(cgroup_cpus or ())
+        requested = set(cid for cid, _ in cgps)
+        cgps = list(cgps) + [(cid, self.cgroups[cid])
+                             for cid in sorted(self.budget.pending)
+                             if cid in self.cgroups and cid not in requested]
+        requested = set(cid for cid, _ in cgps)
+        costs = self._costs(self.cgroups)
+        cgps, left = self.budget.select(cgps, set(priority), costs,
+                                        self.budget.limit(self.pqos))
+        count = len(cgps)
+        selected = set(cid for cid, _ in cgps)
+        # libpgos closes pooled cgroups neither requested nor kept
+        keep, _ = self.budget.fit(
+            [(cid, self.cgroups[cid]) for cid in sorted(self._pooled)
+             if cid in self.cgroups and cid not in selected], costs, left)
+        self._reserve(count + len(keep))
+        ctx.cgroup_count = count + len(keep)
+        self._pooled = selected | set(cid for cid, _ in keep)
+        array = self._array
+        rows = self._rows
+        for i, cgp in enumerate(cgps + keep):
+            row = (cgp, self.cpus.get(cgp[0], ()), i >= count)
+            if rows[i] != row:
+                # only rows with changed cgroup or cpus are encoded again
+                rows[i] = row
+                array[i].cid = cgp[0].encode()
+                array[i].path = cgp[1].encode()
+                array[i].cpu_mask[:] = cpu_mask(row[1])
+                array[i].keep = row[2]
+        data = self._view[:count]
+        if self.samples:
+            self.sub_samples = self._sample_view[:count]
+        self.coverage = np.zeros(count)
+        index = {}
         try:
-            res = self.lib.collect(ctx)
+            if self.continuous:
+                res = self.lib.collect_continuous(ctx)
+            else:
+                res = self.lib.collect(ctx)
         except Exception:
             traceback.print_exc(file=sys.stdout)
-        if res.ret == 0:
-            for i in range(len(cgps)):
-                cg = res.cgroups[i]
-                if cg.ret != 0:
-                    print('error in metrics collect for container: ' +
-                          cg.cid.decode('utf-8') +
-                          ', error code: ' + str(cg.ret))
-                    continue
-                metrics.append((cg.cid.decode('utf-8'),
-                                {
-                                    Metric.INST: cg.instructions,
-                                    Metric.CYC: cg.cycles,
-                                    Metric.L3MISS: cg.llc_misses,
-                                    Metric.L2STALL: cg.stalls_l2_misses,
-                                    Metric.MEMSTALL: cg.stalls_memory_load,
-                                    Metric.L3OCC: cg.llc_occupancy,
-                                    Metric.MBL: cg.mbm_local,
-                                    Metric.MBR: cg.mbm_remote,
-                                }))
-        else:
+            self.coverage = self.coverage[:0]
+            return 0, data[:0], index
+        if res.ret != 0:
             print('error in libpgos collect, error code:' + str(res.ret))
+            self.coverage = self.coverage[:0]
+            return res.timestamp, data[:0], index
 
-        return res.timestamp, metrics
+        pending = []
+        for i, ret in enumerate(data['ret'].tolist()):
+            if ret == 0:
+                index[cgps[i][0]] = i
+            elif ret == Pgos.ERROR_NO_PREVIOUS_SAMPLE:
+                # no previous sample means counting just started
+                pending.append(cgps[i][0])
+            else:
+                print('error in metrics collect for container: ' +
+                      cgps[i][0] + ', error code: ' + str(ret))
+        for cid, coverage in self.budget.update(self.cgroups, index, pending,
+                                                requested).items():
+            self.coverage[index[cid]] = coverage
+        return res.timestamp, data, index
@@ -0,0 +1,62 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements thread id tracking based on cgroup tasks file """
+
+
+class PidTracker(object):
+    """
+    This class tracks all thread ids of one cgroup. The tasks file is read
+    with one read call per update, the content is parsed and diffed only
+    when it differs from the content cached in previous update
+    """
+    READ_SIZE = 65536
+
+    def __init__(self, path):
+        """
+        path - cgroup tasks (or cgroup.procs) file path
+        """
+        self.path = path
+        self.pids = []
+        self._pidset = frozenset()
+        self._raw = None
+
+    def _read(self):
+        with open(self.path, 'rb') as tasksf:
+            chunks = []
+            while True:
+                chunk = tasksf.read(PidTracker.READ_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def update(self):
+        """
+        Refresh thread ids from cgroup, return tuple of added and removed
+        thread ids since previous update, both are empty if nothing changed
+        """
+        raw = self._read()
+        if raw == self._raw:
+            return (), ()
+        self._raw = raw
+        pidset = frozenset(raw.decode().split())
+        added = pidset - self._pidset
+        removed = self._pidset - pidset
+        self._pidset = pidset
+        self.pids = sorted(pidset, key=int)
+        return added, removed
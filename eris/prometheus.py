@@ -17,63 +17,241 @@
 
 """ This module start a prometheus client and expose collected metrics """
 
-from prometheus_client import Gauge, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+import numpy as np
+
+
+class SnapshotCollector(object):
+    """
+    This class is a custom collector holds latest snapshot of container
+    metrics, controller levels and contentions published by the agent, and
+    renders it only when scraped. Series of containers not in the latest
+    snapshot are dropped
+    """
+    CONTAINER_METRICS = (
+        ('cma_cpu_usage_percentage', 'CPU usage percentage of a container'),
+        ('cma_unhalted_cycles', 'Unhalted cycles of a container'),
+        ('cma_llc_misses', 'LLC misses of a container'),
+        ('cma_instructions', 'Instructions of a container'),
+        ('cma_cycles_per_instruction',
+         'Cycles per instruction of a container'),
+        ('cma_misses_per_instruction',
+         'Misses per instruction of a container'),
+        ('cma_stalls_mem_per_instruction',
+         'Stalls memory load per instruction of a container'),
+        ('cma_average_frequency', 'Average frequency of a container'),
+        ('cma_memory_bandwidth', 'Memory bandwidth of a container'),
+        ('cma_llc_occupancy', 'LLC occupancy of a container'),
+        ('cma_counter_coverage',
+         'Share of windows requested since previous sample covered by '
+         'counters of a container'),
+        ('cma_sample_age_seconds',
+         'Age of latest platform metrics sample of a container'),
+    )
+
+    def __init__(self):
+        # every snapshot is replaced as a whole, so scrape thread always
+        # renders a consistent one without locking
+        self._containers = ([], np.zeros((0, len(self.CONTAINER_METRICS))))
+        self._levels = []
+        self._contentions = []
+        self._events = ([], [], None, None)
+
+    def set_containers(self, names, values):
+        """
+        Replace container metrics snapshot
+            names - container names
+            values - 2D array, one row per container in order of names and
+                one column per metric in order of CONTAINER_METRICS
+        """
+        self._containers = (list(names), values)
+
+    def set_levels(self, levels):
+        """
+        Replace controller levels snapshot
+            levels - list of tuple of resource, socket and level
+        """
+        self._levels = list(levels)
+
+    def set_contentions(self, contentions):
+        """
+        Replace contentions snapshot
+            contentions - list of tuple of contended container name and
+                contention type name detected in latest cycle
+        """
+        self._contentions = list(contentions)
+
+    def set_events(self, names, events, values, ratios):
+        """
+        Replace extra perf events snapshot
+            names - container names
+            events - extra perf event names
+            values - 2D array of event counts, one row per container
+            ratios - 2D array of running ratios, one row per container, first
+                column is of default counter group followed by every event
+        """
+        self._events = (list(names), list(events), values, ratios)
+
+    def collect(self):
+        names, values = self._containers
+        for col, (name, doc) in enumerate(self.CONTAINER_METRICS):
+            family = GaugeMetricFamily(name, doc, labels=['container'])
+            for cname, value in zip(names, values[:, col].tolist()):
+                family.add_metric([cname], value)
+            yield family
+        family = GaugeMetricFamily(
+            'cma_controller_level',
+            'Resource level of best-efforts tasks controller, -1 is full',
+            labels=['resource', 'socket'])
+        for resource, socket, level in self._levels:
+            family.add_metric([resource, socket], level)
+        yield family
+        family = GaugeMetricFamily(
+            'cma_contention',
+            'Resource contention detected in latest metrics cycle',
+            labels=['container', 'contention'])
+        for cname, contention in self._contentions:
+            family.add_metric([cname, contention], 1)
+        yield family
+        names, events, values, ratios = self._events
+        family = GaugeMetricFamily(
+            'cma_perf_event', 'Extra perf event count of a container',
+            labels=['container', 'event'])
+        for i, cname in enumerate(names):
+            for event, value in zip(events, values[i].tolist()):
+                family.add_metric([cname, event], value)
+        yield family
+        family = GaugeMetricFamily(
+            'cma_perf_running_ratio',
+            'Time running over time enabled of perf event group of a\
+ container, counts are scaled when it is less than 1',
+            labels=['container', 'event'])
+        for i, cname in enumerate(names):
+            for event, ratio in zip(['default'] + events, ratios[i].tolist()):
+                family.add_metric([cname, event], ratio)
+        yield family
 
 
 class PrometheusClient:
+    DURATION_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25,
+                        .5, 1, 2.5, 5, 10, 30, 60)
+
     def __init__(self):
-        self.gauge_cpu_usage_percentage = Gauge('cma_cpu_usage_percentage',
-                                                'CPU usage percentage of a\
-                                                container', ['container'])
-        self.gauge_llc_misses = Gauge('cma_llc_misses',
-                                      'CPU usage percentage of a container',
-                                      ['container'])
-        self.gauge_unhalted_cycles = Gauge('cma_unhalted_cycles',
-                                           'CPU usage percentage of a\
-                                           container', ['container'])
-        self.gauge_instructions = Gauge('cma_instructions',
-                                        'Instructions of a container',
-                                        ['container'])
-        self.gauge_cycles_per_instruction = Gauge('cma_cycles_per_instruction',
-                                                  'Cycles per instruction of a\
-                                                  container', ['container'])
-        self.gauge_misses_per_instruction = Gauge('cma_misses_per_instruction',
-                                                  'Misses per instruction of a\
-                                                  container', ['container'])
-        self.gauge_stalls_mem_per_instruction = Gauge(
-            'cma_stalls_mem_per_instruction',
-            'Stalls memory load per instruction of a container', ['container'])
-        self.gauge_average_frequency = Gauge('cma_average_frequency',
-                                             'Instructions of a container',
-                                             ['container'])
-        self.gauge_memory_bandwidth = Gauge('cma_memory_bandwidth',
-                                            'Instructions of a container',
-                                            ['container'])
-        self.gauge_llc_occupancy = Gauge('cma_llc_occupancy',
-                                         'Instructions of a container',
-                                         ['container'])
+        self.snapshot = SnapshotCollector()
+        REGISTRY.register(self.snapshot)
+        self.gauge_group_llc_occupancy = Gauge(
+            'cma_group_llc_occupancy',
+            'LLC occupancy of a resctrl group on a socket',
+            ['group', 'socket'])
+        self.gauge_group_memory_bandwidth_local = Gauge(
+            'cma_group_memory_bandwidth_local',
+            'Local memory bandwidth of a resctrl group on a socket',
+            ['group', 'socket'])
+        self.gauge_group_memory_bandwidth_remote = Gauge(
+            'cma_group_memory_bandwidth_remote',
+            'Remote memory bandwidth of a resctrl group on a socket',
+            ['group', 'socket'])
+        self.histogram_cycle_duration = Histogram(
+            'cma_agent_cycle_duration_seconds',
+            'Duration of one eris agent monitor cycle', ['task'],
+            buckets=PrometheusClient.DURATION_BUCKETS)
+        self.histogram_cycle_lateness = Histogram(
+            'cma_agent_cycle_lateness_seconds',
+            'Delay of eris agent monitor cycle start after its tick',
+            ['task'], buckets=PrometheusClient.DURATION_BUCKETS)
+        self.histogram_stage_duration = Histogram(
+            'cma_agent_stage_duration_seconds',
+            'Duration of one stage in eris agent monitor cycle', ['stage'],
+            buckets=PrometheusClient.DURATION_BUCKETS)
+        self.counter_containers_processed = Counter(
+            'cma_agent_containers_processed',
+            'Containers processed in eris agent monitor cycles', ['task'])
+        self.counter_cycle_overruns = Counter(
+            'cma_agent_cycle_overruns',
+            'Eris agent monitor cycles overran their interval', ['task'])
+        self.counter_skipped_ticks = Counter(
+            'cma_agent_skipped_ticks',
+            'Eris agent monitor ticks skipped due to overrun', ['task'])
+        self.counter_contention_events = Counter(
+            'cma_contention_events',
+            'Resource contentions detected on latency-critical tasks',
+            ['contention'])
 
     def start(self):
         start_http_server(8080)
 
-    def send_metrics(self, container_name, cpu_usage_percentage,
-                     unhalted_cycle, llc_miss, instructions,
-                     cycles_per_instruction, misses_per_instruction,
-                     stalls_mem_load_per_instruction, average_frequency,
-                     memory_bandwidth, llc_occupancy):
-        self.gauge_cpu_usage_percentage.labels(container_name).set(
-            cpu_usage_percentage)
-        self.gauge_unhalted_cycles.labels(container_name).set(unhalted_cycle)
-        self.gauge_llc_misses.labels(container_name).set(llc_miss)
-        self.gauge_instructions.labels(container_name).set(instructions)
-        self.gauge_cycles_per_instruction.labels(container_name).set(
-            cycles_per_instruction)
-        self.gauge_misses_per_instruction.labels(container_name).set(
-            misses_per_instruction)
-        self.gauge_stalls_mem_per_instruction.labels(container_name).set(
-            stalls_mem_load_per_instruction)
-        self.gauge_average_frequency.labels(container_name).set(
-            average_frequency)
-        self.gauge_memory_bandwidth.labels(container_name).set(
-            memory_bandwidth)
-        self.gauge_llc_occupancy.labels(container_name).set(llc_occupancy)
+    def send_metrics(self, names, values):
+        """
+        Publish metrics of all containers in latest cycle
+            names - container names
+            values - 2D array, one row per container and one column per
+                metric in order of SnapshotCollector.CONTAINER_METRICS
+        """
+        self.snapshot.set_containers(names, values)
+
+    def send_levels(self, levels):
+        """
+        Publish current levels of best-efforts tasks controllers
+            levels - list of tuple of resource, socket and level
+        """
+        self.snapshot.set_levels(levels)
+
+    def send_contentions(self, contentions):
+        """
+        Publish contentions detected in latest cycle
+            contentions - list of tuple of container name and contention type
+        """
+        self.snapshot.set_contentions(contentions)
+        for _, contention in contentions:
+            self.counter_contention_events.labels(contention).inc()
+
+    def send_events(self, names, events, values, ratios):
+        """
+        Publish extra perf events and running ratios of latest cycle
+            names - container names
+            events - extra perf event names
+            values - 2D array of event counts, one row per container
+            ratios - 2D array of running ratios, one row per container, first
+                column is of default counter group followed by every event
+        """
+        self.snapshot.set_events(names, events, values, ratios)
+
+    def send_group_metrics(self, group, socket, llc_occupancy,
+                           memory_bandwidth_local, memory_bandwidth_remote):
+        self.gauge_group_llc_occupancy.labels(group, socket).set(
+            llc_occupancy)
+        self.gauge_group_memory_bandwidth_local.labels(group, socket).set(
+            memory_bandwidth_local)
+        self.gauge_group_memory_bandwidth_remote.labels(group, socket).set(
+            memory_bandwidth_remote)
+
+    def stage(self, stage):
+        """
+        Return context manager observes duration of one agent stage
+            stage - stage name
+        """
+        return self.histogram_stage_duration.labels(stage).time()
+
+    def observe_cycle(self, task, lateness, duration, skipped):
+        """
+        Observe one finished agent monitor cycle
+            task - monitor task name
+            lateness - seconds between scheduled and actual start
+            duration - seconds spent in the cycle
+            skipped - ticks skipped because the cycle overran
+        """
+        self.histogram_cycle_lateness.labels(task).observe(lateness)
+        self.histogram_cycle_duration.labels(task).observe(duration)
+        if skipped:
+            self.counter_cycle_overruns.labels(task).inc()
+            self.counter_skipped_ticks.labels(task).inc(skipped)
+
+    def count_containers(self, task, count):
+        """
+        Count containers processed in one agent monitor cycle
+            task - monitor task name
+            count - number of containers
+        """
+        self.counter_containers_processed.labels(task).inc(count)
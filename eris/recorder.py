@@ -0,0 +1,262 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements background recorder of utilization and metrics """
+
+from __future__ import print_function
+
+import json
+import os
+import sys
+import time
+import traceback
+
+from datetime import datetime
+from threading import Thread
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+import numpy as np
+import pandas as pd
+
+from dateutil.tz import tzlocal
+
+
+class RecordFormat(object):
+    """ This class defines supported record file formats """
+    CSV = 'csv'
+    BINARY = 'binary'
+
+
+BINARY_MAGIC = b'ERISREC1\n'
+STR_COLS = {'time': 'S32', 'cid': 'S64', 'name': 'S64'}
+
+
+def encode_str(val, size):
+    """
+    Encode string column value in UTF-8, return tuple of bytes no longer
+    than size and whether the value is truncated, truncation keeps whole
+    characters
+        val - column value
+        size - column width in bytes
+    """
+    data = str(val).encode('utf-8')
+    if len(data) <= size:
+        return data, False
+    return data[:size].decode('utf-8', 'ignore').encode('utf-8'), True
+
+
+def record_dtype(cols):
+    """
+    Build fixed width record type of binary format, string columns are fixed
+    width byte strings and others are 64 bit float
+        cols - column names
+    """
+    return np.dtype([(col, STR_COLS.get(col, '<f8')) for col in cols])
+
+
+def read_records(path):
+    """
+    Read recorded file in either format into DataFrame
+        path - recorded file path
+    """
+    with open(path, 'rb') as recf:
+        magic = recf.read(len(BINARY_MAGIC))
+        if magic != BINARY_MAGIC:
+            recf.seek(0)
+            return pd.read_csv(recf)
+        descr = json.loads(recf.readline().decode())
+        data = np.frombuffer(recf.read(),
+                             dtype=np.dtype([tuple(d) for d in descr]))
+    frame = pd.DataFrame(data)
+    for col in frame.columns:
+        if data.dtype[col].kind == 'S':
+            frame[col] = frame[col].str.decode('utf-8')
+    try:
+        # metrics are recorded with epoch seconds, same as in csv format
+        frame['time'] = pd.to_numeric(frame['time'])
+    except (KeyError, ValueError):
+        pass
+    return frame
+
+
+def record_times(times):
+    """
+    Parse time column of recorded file into naive local time, metrics are
+    recorded with epoch seconds and utilization with ISO format local time
+        times - time column Series
+    """
+    if pd.api.types.is_numeric_dtype(times):
+        return pd.to_datetime(times, unit='s', utc=True).dt.tz_convert(
+            tzlocal()).dt.tz_localize(None)
+    return pd.to_datetime(times)
+
+
+class Recorder(object):
+    """
+    This class records rows into file from a writer thread. Rows are put into
+    a bounded queue without blocking the caller, the writer drains the queue
+    in batches and rotates the file by size or age, every rotated file starts
+    with the header
+    """
+    BATCH_SIZE = 512
+    QUEUE_SIZE = 65536
+
+    def __init__(self, path, cols, fmt=RecordFormat.CSV, max_bytes=0,
+                 max_age=0, queue_size=QUEUE_SIZE, verbose=False):
+        """
+        path - record file path
+        cols - column names
+        fmt - record file format, csv or binary
+        max_bytes - rotate file when its size exceeds, 0 means no rotation
+        max_age - rotate file after seconds, 0 means no rotation
+        queue_size - maximal number of rows pending in queue
+        """
+        self.path = path
+        self.cols = [getattr(col, 'value', col) for col in cols]
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.verbose = verbose
+        self.dropped = 0
+        self.dtype = record_dtype(self.cols)
+        self._truncated = set()
+        self._queue = Queue(queue_size)
+        self._thread = None
+        self._file = None
+        self._opened = 0
+        self._stopped = False
+
+    def _header(self):
+        if self.fmt == RecordFormat.BINARY:
+            descr = [list(d) for d in self.dtype.descr]
+            return BINARY_MAGIC + (json.dumps(descr) + '\n').encode()
+        return (','.join(self.cols) + '\n').encode()
+
+    def _open(self):
+        header = self._header()
+        existing = b''
+        try:
+            with open(self.path, 'rb') as recf:
+                existing = recf.read(len(header))
+        except IOError:
+            pass
+        self._file = open(self.path, 'ab' if existing == header else 'wb')
+        if existing != header:
+            self._file.write(header)
+        self._opened = time.time()
+
+    def _rotate(self):
+        self._file.close()
+        suffix = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        os.rename(self.path, self.path + '.' + suffix)
+        self._open()
+
+    def _need_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return self.max_age and time.time() - self._opened >= self.max_age
+
+    def _encode_str(self, val, size):
+        data, truncated = encode_str(val, size)
+        if truncated and val not in self._truncated:
+            # warn once for every value longer than column width
+            self._truncated.add(val)
+            print('value ' + str(val) + ' is truncated to ' + str(size) +
+                  ' bytes in ' + self.path)
+        return data
+
+    def _encode(self, rows):
+        if self.fmt == RecordFormat.BINARY:
+            dtype = self.dtype
+            data = np.array(
+                [tuple(self._encode_str(val, dtype[i].itemsize)
+                       if dtype[i].kind == 'S' else float(val)
+                       for i, val in enumerate(row))
+                 for row in rows], dtype=dtype)
+            return data.tobytes()
+        return ''.join(','.join(str(val) for val in row) + '\n'
+                       for row in rows).encode()
+
+    def _write(self, rows):
+        try:
+            self._file.write(self._encode(rows))
+            self._file.flush()
+            if self._need_rotate():
+                self._rotate()
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+
+    def _drain(self):
+        while True:
+            try:
+                row = self._queue.get(timeout=1)
+            except Empty:
+                if self._stopped:
+                    break
+                continue
+            if row is None:
+                break
+            rows = [row]
+            while len(rows) < Recorder.BATCH_SIZE:
+                try:
+                    row = self._queue.get_nowait()
+                except Empty:
+                    break
+                if row is None:
+                    self._write(rows)
+                    return
+                rows.append(row)
+            self._write(rows)
+
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            self._file.close()
+
+    def start(self):
+        """ open record file and start writer thread """
+        self._open()
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, row):
+        """
+        Queue one row without blocking, row is dropped if queue is full
+            row - values in order of columns
+        """
+        try:
+            self._queue.put_nowait(row)
+        except Full:
+            self.dropped += 1
+            if self.verbose:
+                print('recorder queue of ' + self.path + ' is full, ' +
+                      str(self.dropped) + ' rows dropped')
+
+    def stop(self):
+        """ write pending rows and stop writer thread """
+        self._stopped = True
+        try:
+            self._queue.put_nowait(None)
+        except Full:
+            pass
+        if self._thread is not None:
+            self._thread.join()
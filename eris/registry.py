@@ -0,0 +1,147 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements container registry fed by Docker event stream """
+
+from __future__ import print_function
+
+import sys
+import time
+import traceback
+
+from threading import Lock, Thread
+
+
+class ContainerRegistry(object):
+    """
+    This class keeps the single map of running containers shared by all
+    monitor loops. The map is updated incrementally from Docker container
+    events and reconciled against the container list periodically
+    """
+    ADD_EVENTS = ('start', 'unpause')
+    REMOVE_EVENTS = ('die', 'destroy')
+
+    def __init__(self, docker_client, factory, reconcile_interval=60,
+                 verbose=False, timer=None, on_event=None):
+        """
+        docker_client - Docker client used for event stream and list
+        factory - callable creates Container from container id and name
+        reconcile_interval - seconds between two full container list
+        timer - optional callable returns context manager observes duration
+            of named stage, used to time reconcile
+        on_event - optional callable called with container id of every start
+            or die event handled, a restarted container keeps its id
+        """
+        self.docker_client = docker_client
+        self.factory = factory
+        self.reconcile_interval = reconcile_interval
+        self.timer = timer
+        self.on_event = on_event
+        self.verbose = verbose
+        self.shutdown = False
+        self._cons = dict()
+        self._lock = Lock()
+        self._thread = None
+
+    def start(self):
+        """ build initial container map and start to watch Docker events """
+        self.reconcile()
+        self._thread = Thread(target=self._watch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown = True
+
+    def snapshot(self):
+        """ return a copy of current container map, keyed by container id """
+        with self._lock:
+            return dict(self._cons)
+
+    def reconcile(self):
+        """ sync container map with running containers listed from Docker """
+        if self.timer is None:
+            self._reconcile()
+        else:
+            with self.timer('reconcile'):
+                self._reconcile()
+
+    def _reconcile(self):
+        containers = self.docker_client.containers.list()
+        cids = set()
+        for container in containers:
+            cids.add(container.id)
+            self._add(container.id, container.name)
+        for cid in self.snapshot():
+            if cid not in cids:
+                self._remove(cid)
+
+    def _add(self, cid, name):
+        with self._lock:
+            if cid in self._cons:
+                return
+        con = self.factory(cid, name)
+        with self._lock:
+            if cid in self._cons:
+                return
+            self._cons[cid] = con
+        if self.verbose:
+            print('container ' + name + ' is added to registry')
+
+    def _remove(self, cid):
+        with self._lock:
+            con = self._cons.pop(cid, None)
+        if con is None:
+            return
+        if self.verbose:
+            print('container ' + con.name + ' is removed from registry')
+
+    def _handle_event(self, event):
+        action = event.get('Action', event.get('status'))
+        cid = event.get('id')
+        if not cid:
+            return
+        if self.on_event is not None and action in ('start', 'die'):
+            self.on_event(cid)
+        if action in ContainerRegistry.ADD_EVENTS:
+            name = event['Actor']['Attributes'].get('name', cid)
+            self._add(cid, name)
+        elif action in ContainerRegistry.REMOVE_EVENTS:
+            self._remove(cid)
+
+    def _watch(self):
+        """
+        Consume Docker container events in windows of reconcile interval,
+        full reconcile is done between two windows, the next window starts
+        from end of previous one so no event is lost
+        """
+        since = int(time.time())
+        while not self.shutdown:
+            until = since + self.reconcile_interval
+            try:
+                events = self.docker_client.events(
+                    since=since, until=until, decode=True,
+                    filters={'type': 'container'})
+                for event in events:
+                    if self.shutdown:
+                        break
+                    self._handle_event(event)
+                self.reconcile()
+                since = until
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                time.sleep(1)
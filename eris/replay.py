@@ -0,0 +1,242 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements offline replay of recorded platform metrics. Records
+are sorted once, every container is screened with array operations over its
+whole history, and only cycles passing the screen are replayed through
+Container contention detection
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analyze.analyzer import Metric, ThreshType
+from container import Container, Contention
+from contender import ContenderIndex
+from eris import detect_contender
+from recorder import record_times
+
+SCREEN_COLUMNS = [Metric.UTIL.value, Metric.CPI.value, Metric.NF.value,
+                  Metric.L3OCC.value, Metric.MBL.value, Metric.MBR.value]
+
+
+def slice_records(frame, start=None, end=None):
+    """
+    Return records with time in [start, end], bounds are local time
+        frame - recorded DataFrame
+        start - first time kept, None means no lower bound
+        end - last time kept, None means no upper bound
+    """
+    if start is None and end is None:
+        return frame
+    times = record_times(frame['time'])
+    mask = np.ones(len(frame), dtype=bool)
+    if start is not None:
+        mask &= (times >= pd.Timestamp(start)).values
+    if end is not None:
+        mask &= (times <= pd.Timestamp(end)).values
+    return frame[mask]
+
+
+def find_bins(thresh, utils):
+    """
+    Return utilization bin index of every cycle, -1 if not in any bin. Bins
+    are searched the same way as Container contention detection does
+        thresh - utilization bins of container
+        utils - utilization array
+    """
+    bins = np.full(len(utils), -1)
+    undecided = np.ones(len(utils), dtype=bool)
+    last = len(thresh) - 1
+    for i, bin_thresh in enumerate(thresh):
+        below = undecided & (utils < bin_thresh['util_start'])
+        if i > 0:
+            bins[below] = i - 1
+        undecided &= ~below
+        inside = undecided & (utils >= bin_thresh['util_start'])
+        if i != last:
+            inside &= utils < bin_thresh['util_end']
+        bins[inside] = i
+        undecided &= ~inside
+    return bins
+
+
+def history_delta(values, starts, depth):
+    """
+    Return delta of every value from mean of up to depth previous values of
+    the same run, value itself for first value of a run
+        values - metric array of one container in time order
+        starts - position of first value of the run every value belongs to
+        depth - maximal number of previous values
+    """
+    sums = np.concatenate(([0.0], np.cumsum(values, dtype=float)))
+    pos = np.arange(len(values))
+    count = np.minimum(pos - starts, depth)
+    older = sums[pos] - sums[pos - count]
+    mean = np.divide(older, count, out=np.zeros(len(values)),
+                     where=count > 0)
+    return np.where(count > 0, values - mean, values)
+
+
+def screen_container(columns, codes, thresh, tdp_thresh, depth, verbose):
+    """
+    Screen all cycles of one container, return tuple of positions of cycles
+    possibly contended, LLC occupancy delta, memory bandwidth and frequency
+    delta arrays
+        columns - map from metric name to array in time order
+        codes - time index of every cycle
+        thresh - utilization bins of container
+        tdp_thresh - TDP threshold of container
+        depth - number of previous cycles compared with current one
+        verbose - if TDP detection of every cycle is printed
+    """
+    # history restarts when container is missing in one cycle
+    restart = np.ones(len(codes), dtype=bool)
+    restart[1:] = codes[1:] != codes[:-1] + 1
+    starts = np.maximum.accumulate(
+        np.where(restart, np.arange(len(codes)), 0))
+
+    utils = columns[Metric.UTIL.value].astype(float)
+    flagged = np.zeros(len(codes), dtype=bool)
+    if thresh:
+        bins = find_bins(thresh, utils)
+        cpis = np.array([bin_thresh['cpi'] for bin_thresh in thresh] + [0.0])
+        flagged |= (bins >= 0) &\
+            (columns[Metric.CPI.value].astype(float) > cpis[bins])
+    if tdp_thresh:
+        if verbose:
+            flagged[:] = True
+        else:
+            flagged |= (utils >= tdp_thresh['util']) &\
+                (columns[Metric.NF.value].astype(float) < tdp_thresh['bar'])
+
+    mbt = columns[Metric.MBL.value].astype(float) +\
+        columns[Metric.MBR.value].astype(float)
+    return (np.flatnonzero(flagged),
+            history_delta(columns[Metric.L3OCC.value].astype(np.int64),
+                          starts, depth),
+            mbt,
+            history_delta(columns[Metric.NF.value].astype(float), starts,
+                          depth))
+
+
+class Replay(object):
+    """
+    This class replays recorded metrics of all containers in time order.
+    Containers are screened independently, optionally in parallel, and
+    contenders are ranked among containers recorded in the same cycle
+    """
+
+    def __init__(self, frame, key, analyzer, history_depth=5, suspects=1,
+                 verbose=False):
+        """
+        frame - recorded metrics DataFrame
+        key - column identifies container, cid or name
+        analyzer - Analyzer provides thresholds of containers
+        history_depth - number of previous cycles compared with current one
+        suspects - maximal number of suspects reported for one contention
+        verbose - increase output verbosity
+        """
+        frame = frame.sort_values('time', kind='mergesort')
+        # one cycle of a container is kept if it is recorded more than once
+        frame = frame.drop_duplicates(['time', key], keep='last')
+        self.frame = frame.reset_index(drop=True)
+        self.key = key
+        self.analyzer = analyzer
+        self.history_depth = history_depth
+        self.suspects = suspects
+        self.verbose = verbose
+        self.codes, self.times = pd.factorize(self.frame['time'], sort=True)
+        self.bounds = np.searchsorted(self.codes,
+                                      np.arange(len(self.times) + 1))
+        self.keys = self.frame[key].astype(str).values
+
+    def _screen(self, jobs):
+        groups = self.frame.groupby(self.key, sort=False).indices
+        tasks = []
+        for cid, rows in groups.items():
+            cid = str(cid)
+            columns = dict((col, self.frame[col].values[rows])
+                           for col in SCREEN_COLUMNS)
+            tasks.append((columns, self.codes[rows],
+                          self.analyzer.get_thresh(cid, ThreshType.METRICS),
+                          self.analyzer.get_thresh(cid, ThreshType.TDP),
+                          self.history_depth, self.verbose))
+        if jobs > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(screen_container, *zip(*tasks)))
+        else:
+            results = [screen_container(*task) for task in tasks]
+
+        size = len(self.frame)
+        usages = dict((contend, np.zeros(size)) for contend in
+                      (Contention.LLC, Contention.MEM_BW, Contention.TDP))
+        flagged = []
+        for rows, (pos, llc, mbt, freq) in zip(groups.values(), results):
+            flagged.append(rows[pos])
+            usages[Contention.LLC][rows] = llc
+            usages[Contention.MEM_BW][rows] = mbt
+            usages[Contention.TDP][rows] = freq
+        flagged = np.sort(np.concatenate(flagged)) if flagged else []
+        return flagged, usages
+
+    def _index(self, code, usages):
+        begin, end = self.bounds[code], self.bounds[code + 1]
+        keys = self.keys[begin:end]
+        return ContenderIndex(keys, keys, dict(
+            (contend, usage[begin:end]) for contend, usage in usages.items()))
+
+    def run(self, jobs=1):
+        """
+        Replay all records, contentions and suspects are printed in the same
+        order as records are replayed cycle by cycle
+            jobs - number of processes screening containers
+        """
+        flagged, usages = self._screen(jobs)
+        cons = {}
+        index = None
+        index_code = None
+        for row in flagged:
+            cid = self.keys[row]
+            con = cons.get(cid)
+            if con is None:
+                con = Container('cgroupfs', cid, cid, [], self.verbose,
+                                self.analyzer.get_thresh(
+                                    cid, ThreshType.METRICS),
+                                self.analyzer.get_thresh(
+                                    cid, ThreshType.TDP),
+                                self.history_depth)
+                cons[cid] = con
+            con.update_metrics((row, self.frame.iloc[row]))
+            contend_res = con.contention_detect()
+            tdp_contend = con.tdp_contention_detect()
+            if tdp_contend:
+                contend_res.append(tdp_contend)
+            for contend in contend_res:
+                if contend == Contention.UNKN:
+                    continue
+                code = self.codes[row]
+                if index_code != code:
+                    index = self._index(code, usages)
+                    index_code = code
+                detect_contender(index, contend, con, self.suspects)
@@ -0,0 +1,211 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements resource control through resctrl filesystem """
+
+from __future__ import print_function
+from __future__ import division
+
+import errno
+import os
+import time
+
+from os.path import join as path_join
+
+
+def read_schemata(path):
+    """
+    Read schemata of a control group, return map from resource name to map
+    of domain id to value
+        path - control group directory
+    """
+    res = {}
+    with open(path_join(path, 'schemata')) as schf:
+        for line in schf:
+            if ':' not in line:
+                continue
+            resource, domains = line.strip().split(':', 1)
+            res[resource.strip()] = dict(
+                domain.split('=', 1) for domain in domains.split(';'))
+    return res
+
+
+class ResctrlGroup(object):
+    """
+    This class is one resctrl control group, the group directory is created
+    if it does not exist and kept after agent exits
+    """
+
+    def __init__(self, root, name):
+        """
+        root - resctrl filesystem mount point
+        name - control group name
+        """
+        self.name = name
+        self.path = path_join(root, name)
+        self.pids = set()
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+
+    def write_schemata(self, resource, domains):
+        """
+        Write schemata of one resource, return True if value read back from
+        the group matches the written one
+            resource - resource name, L3 or MB
+            domains - map from domain id to value, bitmask in hex without 0x
+        """
+        line = resource + ':' + ';'.join(
+            str(dom) + '=' + str(val) for dom, val in sorted(domains.items()))
+        with open(path_join(self.path, 'schemata'), 'w') as schf:
+            schf.write(line + '\n')
+        written = read_schemata(self.path).get(resource, {})
+        return all(int(written.get(str(dom), '-1'), 16) == int(str(val), 16)
+                   for dom, val in domains.items())
+
+    def add_tasks(self, pids):
+        """
+        Move thread ids into the group one per write, return thread ids
+        failed to move, thread ids exited already are ignored
+            pids - thread ids
+        """
+        failed = []
+        fd = os.open(path_join(self.path, 'tasks'),
+                     os.O_WRONLY | os.O_APPEND)
+        try:
+            for pid in pids:
+                try:
+                    os.write(fd, (str(pid) + '\n').encode())
+                except OSError as err:
+                    if err.errno != errno.ESRCH:
+                        failed.append(pid)
+        finally:
+            os.close(fd)
+        return failed
+
+    def sync_tasks(self, pids):
+        """
+        Move thread ids not moved by previous call into the group, return
+        thread ids failed to move
+            pids - all thread ids belong to the group
+        """
+        pids = set(pids)
+        newpids = pids - self.pids
+        failed = []
+        if newpids:
+            failed = self.add_tasks(sorted(newpids, key=int))
+            pids.difference_update(failed)
+        self.pids = pids
+        return failed
+
+    def read_mon_data(self):
+        """
+        return map from L3 domain id to map of monitoring event name to
+        value, events not available are skipped
+        """
+        res = {}
+        mon_path = path_join(self.path, 'mon_data')
+        for mon in os.listdir(mon_path):
+            values = {}
+            for event in os.listdir(path_join(mon_path, mon)):
+                try:
+                    with open(path_join(mon_path, mon, event)) as evtf:
+                        values[event] = int(evtf.readline())
+                except (ValueError, IOError):
+                    continue
+            res[str(int(mon.rsplit('_', 1)[1]))] = values
+        return res
+
+
+class GroupMonitor(object):
+    """
+    This class samples LLC occupancy and memory bandwidth of one control
+    group on every L3 domain from resctrl monitoring data
+    """
+
+    def __init__(self, group):
+        """
+        group - ResctrlGroup
+        """
+        self.group = group
+        self._last = None
+        self._last_time = 0
+
+    def sample(self):
+        """
+        return map from L3 domain id to tuple of LLC occupancy in KB, local
+        and remote memory bandwidth in MB/s since previous sample, bandwidth
+        is 0 in first sample
+        """
+        now = time.time()
+        data = self.group.read_mon_data()
+        res = {}
+        for dom, values in data.items():
+            llc = values.get('llc_occupancy', 0) / 1024
+            local = values.get('mbm_local_bytes', 0)
+            total = values.get('mbm_total_bytes', 0)
+            mbl = mbr = 0.0
+            if self._last is not None and dom in self._last:
+                seconds = now - self._last_time
+                last_local, last_total = self._last[dom]
+                if seconds > 0:
+                    mbl = (local - last_local) / 1024 / 1024 / seconds
+                    mbr = ((total - local) - (last_total - last_local)) /\
+                        1024 / 1024 / seconds
+            res[dom] = (llc, mbl, mbr)
+        self._last = dict((dom, (values.get('mbm_local_bytes', 0),
+                                 values.get('mbm_total_bytes', 0)))
+                          for dom, values in data.items())
+        self._last_time = now
+        return res
+
+
+class Resctrl(object):
+    """ This class is the resctrl filesystem mounted at given root """
+    ROOT = '/sys/fs/resctrl'
+
+    def __init__(self, root=ROOT):
+        """
+        root - resctrl filesystem mount point
+        """
+        self.root = root
+        self.groups = {}
+
+    def _read_info(self, resource, name):
+        with open(path_join(self.root, 'info', resource, name)) as infof:
+            return infof.readline().strip()
+
+    def cbm_mask(self):
+        """ return full cache bitmask of L3 as integer """
+        return int(self._read_info('L3', 'cbm_mask'), 16)
+
+    def domains(self, resource='L3'):
+        """
+        return sorted domain ids of resource from default group schemata
+            resource - resource name, L3 or MB
+        """
+        return sorted(read_schemata(self.root).get(resource, {}), key=int)
+
+    def group(self, name):
+        """
+        return control group of given name, created at first use
+            name - control group name
+        """
+        group = self.groups.get(name)
+        if group is None:
+            group = ResctrlGroup(self.root, name)
+            self.groups[name] = group
+        return group
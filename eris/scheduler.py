@@ -0,0 +1,148 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements single threaded scheduler of periodic tasks """
+
+from __future__ import print_function
+
+import asyncio
+import sys
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class TaskStats(object):
+    """ This class keeps schedule statistics of one periodic task """
+
+    def __init__(self, name):
+        self.name = name
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+        self.duration = 0.0
+        self.max_duration = 0.0
+
+    def update(self, lateness, duration, skipped):
+        """
+        Update statistics with one finished cycle
+            lateness - seconds between scheduled and actual start
+            duration - seconds spent in the cycle
+            skipped - ticks skipped because the cycle overran
+        """
+        self.cycles += 1
+        self.lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        if skipped:
+            self.overruns += 1
+            self.skipped += skipped
+
+
+class Scheduler(object):
+    """
+    This class runs periodic tasks as coroutines on one event loop thread,
+    so agent state is only mutated from that thread. Blocking collection is
+    offloaded to a dedicated executor with run_in_executor
+    """
+
+    def __init__(self, ctx, verbose=False, observer=None):
+        """
+        ctx - agent context, scheduler stops when ctx.shutdown is set
+        observer - optional callable called with task name, lateness,
+            duration and skipped ticks after every cycle
+        """
+        self.ctx = ctx
+        self.verbose = verbose
+        self.observer = observer
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.tasks = []
+        self.intervals = {}
+        self.stats = {}
+
+    def add_task(self, name, func, interval):
+        """
+        Add periodic task
+            name - task name used in statistics
+            func - function or coroutine function accepts agent context
+            interval - task interval in seconds
+        """
+        self.tasks.append((name, func))
+        self.intervals[name] = interval
+        self.stats[name] = TaskStats(name)
+
+    def set_interval(self, name, interval):
+        """
+        Change interval of periodic task, takes effect from end of running
+        cycle of the task or from its next tick
+            name - task name
+            interval - task interval in seconds
+        """
+        self.intervals[name] = interval
+
+    def run_in_executor(self, func, *args):
+        """ run blocking function in executor, return awaitable result """
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    async def _run_task(self, name, func):
+        stats = self.stats[name]
+        loop = self.loop
+        next_time = loop.time()
+        while not self.ctx.shutdown:
+            # overrun is measured with the interval the cycle started with
+            interval = self.intervals[name]
+            start = loop.time()
+            lateness = start - next_time
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    await func(self.ctx)
+                else:
+                    func(self.ctx)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+            end = loop.time()
+
+            next_time += interval
+            skipped = 0
+            while next_time <= end:
+                next_time += interval
+                skipped += 1
+            if self.intervals[name] != interval:
+                # interval changed in the cycle starts from its end
+                next_time = end + self.intervals[name]
+            stats.update(lateness, end - start, skipped)
+            if self.observer is not None:
+                self.observer(name, lateness, end - start, skipped)
+            if skipped:
+                print(datetime.now().isoformat(' ') + ' task ' + name +
+                      ' overran, duration: ' + str(end - start) +
+                      ', skipped ticks: ' + str(skipped))
+            await asyncio.sleep(next_time - loop.time())
+
+    def run(self):
+        """ run all tasks until agent is shutdown """
+        asyncio.set_event_loop(self.loop)
+        coros = [self._run_task(name, func) for name, func in self.tasks]
+        try:
+            self.loop.run_until_complete(asyncio.gather(*coros))
+        finally:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,400 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements closed loop simulation of eris agent. Recorded
+utilization and metrics are fed through the agent monitor cycles as fast as
+possible, Docker, libpgos, cgroup and resctrl are replaced by in-memory
+stand-ins and every actuation is reported with the recorded time
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import asyncio
+
+import numpy as np
+
+try:
+    from os import cpu_count
+except ImportError:
+    from multiprocessing import cpu_count
+
+from cgroupwriter import CgroupWriter
+from cpusampler import CpuUsage
+from eris import (Context, build_parser, init_controllers, init_wlset,
+                  mon_metric_cycle, mon_util_cycle, new_container)
+from pgos import CGROUP_DTYPE, Pgos
+from recorder import read_records, record_times
+from replay import slice_records
+from analyze.analyzer import Analyzer, Metric
+
+
+class ReplayAnalyzer(Analyzer):
+    """ This class keeps model updates of simulation in memory """
+
+    def update_lcutilmax(self, lc_utils):
+        self.threshold['lcutilmax'] = lc_utils
+
+
+class MemoryCgroup(object):
+    """ This class is in-memory cgroup filesystem, writes are actuations """
+    CFS_PERIOD = 100000
+
+    def __init__(self, actuate):
+        """
+        actuate - callable reports actuation target and value
+        """
+        self.actuate = actuate
+        self.files = {}
+
+    def read(self, path):
+        """ read control file, CFS period is the default one """
+        if path.endswith('cpu.cfs_period_us'):
+            return str(self.files.get(path, MemoryCgroup.CFS_PERIOD))
+        return str(self.files.get(path, ''))
+
+    def write(self, path, value):
+        """ write control file """
+        self.files[path] = value
+        self.actuate(path, value)
+
+
+class MemoryResctrlGroup(object):
+    """ This class is in-memory resctrl control group """
+
+    def __init__(self, name, actuate):
+        self.name = name
+        self.actuate = actuate
+        self.pids = set()
+        self.schemata = {}
+
+    def write_schemata(self, resource, domains):
+        self.schemata.setdefault(resource, {}).update(domains)
+        self.actuate(self.name + '/schemata', resource + ':' + ';'.join(
+            str(dom) + '=' + str(val) for dom, val in sorted(domains.items())))
+        return True
+
+    def sync_tasks(self, pids):
+        pids = set(pids)
+        if pids - self.pids:
+            self.actuate(self.name + '/tasks',
+                         ','.join(sorted(pids - self.pids, key=int)))
+        self.pids = pids
+        return []
+
+    def read_mon_data(self):
+        return {}
+
+
+class MemoryResctrl(object):
+    """ This class is in-memory resctrl filesystem """
+
+    def __init__(self, actuate, cbm_bits=11, domains=1):
+        """
+        actuate - callable reports actuation target and value
+        cbm_bits - bit count of full L3 cache bitmask
+        domains - L3 domain count
+        """
+        self.actuate = actuate
+        self.cbm_bits = cbm_bits
+        self.domain_ids = [str(dom) for dom in range(domains)]
+        self.groups = {}
+
+    def cbm_mask(self):
+        return (1 << self.cbm_bits) - 1
+
+    def domains(self, resource='L3'):
+        return list(self.domain_ids)
+
+    def group(self, name):
+        group = self.groups.get(name)
+        if group is None:
+            group = MemoryResctrlGroup(name, self.actuate)
+            self.groups[name] = group
+        return group
+
+
+class StaticPids(object):
+    """ This class stands in PidTracker of replayed container """
+    pids = []
+
+    def update(self):
+        return (), ()
+
+
+class ReplayRegistry(object):
+    """ This class stands in container registry fed by recorded containers """
+
+    def __init__(self, factory):
+        """
+        factory - callable creates Container from container id and name
+        """
+        self.factory = factory
+        self.cons = {}
+
+    def update(self, names, remove=True):
+        """
+        Add recorded containers and remove containers not recorded
+            names - map from container id to name of recorded containers
+            remove - if containers not recorded are removed
+        """
+        if remove:
+            for cid in set(self.cons) - set(names):
+                del self.cons[cid]
+        for cid, name in names.items():
+            if cid not in self.cons:
+                con = self.factory(cid, name)
+                con.pid_tracker = StaticPids()
+                self.cons[cid] = con
+
+    def snapshot(self):
+        return dict(self.cons)
+
+
+class ReplaySampler(object):
+    """
+    This class stands in CPU usage sampler. Utilization and metrics cycles
+    keep separate usage counters, every sample advances counters of current
+    cycle by one step at recorded utilization
+    """
+    STEP = 1e9
+
+    def __init__(self):
+        self.kind = None
+        self.utils = {}
+        self.system = {}
+        self.usages = {}
+
+    def feed(self, kind, utils):
+        """
+        Set recorded utilization of next samples
+            kind - cycle kind, util or metric
+            utils - map from container id to recorded utilization
+        """
+        self.kind = kind
+        self.utils = utils
+        self.system.setdefault(kind, 0.0)
+        self.usages.setdefault(kind, {})
+
+    def sample(self, cons):
+        system = self.system[self.kind] + ReplaySampler.STEP
+        usages = self.usages[self.kind]
+        for cid, util in self.utils.items():
+            if cid in usages:
+                usages[cid] += util / 100 * ReplaySampler.STEP
+            else:
+                # new container looks busy at recorded utilization ever since
+                usages[cid] = util / 100 * system
+        self.system[self.kind] = system
+        return CpuUsage(system, dict(usages), 1)
+
+
+class ReplayPgos(object):
+    """ This class stands in libpgos wrapper fed by recorded metrics """
+    sockets = 1
+    events = []
+    sub_samples = None
+
+    def __init__(self):
+        self.cgroups = {}
+        self.timestamp = 0
+        self.rows = {}
+
+    def feed(self, timestamp, rows):
+        """
+        Set recorded metrics returned by next collect
+            timestamp - recorded time
+            rows - map from container id to recorded metrics row
+        """
+        self.timestamp = timestamp
+        self.rows = rows
+
+    def add_cgroup(self, cid, path, cpus=None):
+        self.cgroups[cid] = path
+        return 0
+
+    def remove_cgroup(self, cid):
+        self.cgroups.pop(cid, None)
+
+    def set_period(self, period):
+        pass
+
+    def collect(self, cgps, priority=(), cpus=None):
+        self.cgroups = dict(cgps)
+        self.coverage = np.ones(len(cgps))
+        data = np.zeros(len(cgps), dtype=CGROUP_DTYPE)
+        index = {}
+        for i, (cid, _) in enumerate(cgps):
+            row = self.rows.get(cid)
+            if row is None:
+                continue
+            for metric, field in Pgos.METRIC_FIELDS:
+                data[field][i] = row[metric.value]
+            data['ratio'][i] = 1.0
+            index[cid] = i
+        return self.timestamp, data, index
+
+
+class ReplayScheduler(object):
+    """ This class stands in scheduler, blocking calls run inline """
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def run_in_executor(self, func, *args):
+        future = self.loop.create_future()
+        future.set_result(func(*args))
+        return future
+
+    def set_interval(self, name, interval):
+        pass
+
+
+class Simulator(object):
+    """
+    This class replays recorded cycles in time order through agent monitor
+    cycles, utilization cycle goes first when both are recorded at one time
+    """
+
+    def __init__(self, ctx, utils=None, metrics=None):
+        """
+        ctx - agent context with stand-ins
+        utils - recorded utilization DataFrame
+        metrics - recorded metrics DataFrame
+        """
+        self.ctx = ctx
+        self.utils = utils
+        self.metrics = metrics
+        self.now = None
+        self.actuations = 0
+
+    def actuate(self, target, value):
+        """
+        Report one actuation with recorded time of current cycle
+            target - control file or group written
+            value - value written
+        """
+        self.actuations += 1
+        print('%s actuation %s = %s' % (self.now, target, value))
+
+    def _cycles(self):
+        cycles = []
+        if self.utils is not None:
+            # rows of LC utilization sum and load average have no cid, it
+            # is NaN in csv and empty string in binary files
+            utils = self.utils[self.utils['cid'].fillna('') != '']
+            for time, rows in utils.groupby(record_times(utils['time'])):
+                cycles.append((time, 0, rows))
+        if self.metrics is not None:
+            metrics = self.metrics
+            for time, rows in metrics.groupby(
+                    record_times(metrics['time'])):
+                cycles.append((time, 1, rows))
+        cycles.sort(key=lambda cycle: cycle[:2])
+        return cycles
+
+    def run(self):
+        """ replay all recorded cycles, return count of actuations """
+        ctx = self.ctx
+        loop = ctx.scheduler.loop
+        util_col = Metric.UTIL.value
+        for time, kind, rows in self._cycles():
+            self.now = time.isoformat(' ')
+            cids = rows['cid'].astype(str).tolist()
+            names = dict(zip(cids, rows['name'].astype(str).tolist()))
+            utils = dict(zip(cids, rows[util_col].astype(float).tolist()))
+            if kind == 0:
+                ctx.registry.update(names)
+                ctx.cpu_sampler.feed('util', utils)
+                mon_util_cycle(ctx)
+            else:
+                ctx.registry.update(names, self.utils is None)
+                ctx.cpu_sampler.feed('metric', utils)
+                ctx.pgos.feed(rows['time'].iloc[0], dict(
+                    zip(cids, rows.to_dict('records'))))
+                loop.run_until_complete(mon_metric_cycle(ctx))
+        return self.actuations
+
+
+def main():
+    """ Script entry point. """
+    parser = build_parser()
+    parser.description = 'This tool replays CPU utilization and platform\
+                          metrics recorded by eris agent through agent\
+                          contention detection and resource regulation, and\
+                          reports every resource actuation'
+    parser.add_argument('--util-file', help='utilization file recorded by\
+                        eris agent, in csv or binary format')
+    parser.add_argument('--metric-file', help='metrics file recorded by eris\
+                        agent, in csv or binary format')
+    parser.add_argument('--start', help='replay data recorded at or after\
+                        given time')
+    parser.add_argument('--end', help='replay data recorded at or before\
+                        given time')
+    parser.add_argument('--cbm-bits', help='bit count of simulated full L3\
+                        cache bitmask', type=int, default=11)
+    parser.add_argument('--l3-domains', help='simulated L3 domain count',
+                        type=int, default=1)
+    parser.add_argument('--cpus', help='logical processor count of recorded\
+                        node, used when model file has no LC tasks maximal\
+                        utilization', type=int, default=cpu_count())
+    args = parser.parse_args()
+    if args.util_file is None and args.metric_file is None:
+        parser.error('at least one of --util-file and --metric-file is\
+                     required')
+    # simulation never records, exports or adapts metrics interval
+    args.record = False
+    args.enable_prometheus = False
+    args.adaptive_interval = False
+    if args.verbose:
+        print(args)
+
+    ctx = Context()
+    ctx.args = args
+    ctx.metric_interval = args.metric_interval
+    ctx.analyzer = ReplayAnalyzer(args.workload_conf_file, args.thresh_file)
+    init_wlset(ctx)
+    ctx.sysmax_util = ctx.analyzer.get_lcutilmax()
+    if ctx.sysmax_util == 0:
+        ctx.sysmax_util = args.cpus * 100
+
+    utils = metrics = None
+    if args.util_file:
+        utils = slice_records(read_records(args.util_file), args.start,
+                              args.end)
+    if args.metric_file:
+        metrics = slice_records(read_records(args.metric_file), args.start,
+                                args.end)
+    sim = Simulator(ctx, utils, metrics)
+    if args.control:
+        cgroupfs = MemoryCgroup(sim.actuate)
+        init_controllers(ctx, MemoryResctrl(sim.actuate, args.cbm_bits,
+                                            args.l3_domains),
+                         CgroupWriter(cgroupfs.write), cgroupfs.read)
+    ctx.registry = ReplayRegistry(
+        lambda cid, name: new_container(ctx, cid, name))
+    ctx.cpu_sampler = ReplaySampler()
+    ctx.pgos = ReplayPgos()
+    ctx.scheduler = ReplayScheduler(asyncio.new_event_loop())
+
+    count = sim.run()
+    print('%d actuations in simulation' % count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests counter budget of cgroups counted in turn """
+
+from pgos import CounterBudget
+
+
+COSTS = {'lc': 11, 'be1': 11, 'be2': 11}
+
+
+def run_windows(budget, requests, priority, limit):
+    results = []
+    for requested in requests:
+        cgps = [(cid, '/' + cid) for cid in requested]
+        selected, _ = budget.select(cgps, priority, COSTS, limit)
+        index = dict((cid, i) for i, (cid, _) in enumerate(selected))
+        results.append(budget.update(['lc', 'be1', 'be2'], index, [],
+                                     requested))
+    return results
+
+
+def test_rotation_lowers_coverage():
+    results = run_windows(CounterBudget(4), [['lc', 'be1', 'be2']] * 3,
+                          set(['lc']), (None, 2))
+    assert results[0] == {'lc': 1.0, 'be1': 1.0}
+    assert results[1] == {'lc': 1.0, 'be2': 0.5}
+    assert results[2] == {'lc': 1.0, 'be1': 0.5}
+
+
+def test_windows_not_requested_keep_coverage():
+    requests = [['lc', 'be1'], ['lc'], ['lc'], ['lc', 'be1']]
+    results = run_windows(CounterBudget(4), requests, set(['lc']),
+                          (None, None))
+    assert results[3] == {'lc': 1.0, 'be1': 1.0}
+
+
+def test_pinned_cgroups_cost_their_cpus():
+    budget = CounterBudget(8)
+    costs = dict((cid, budget.cost(cpus, 0)) for cid, cpus in
+                 [('lc', ()), ('be1', (0, 1)), ('be2', (2, 3))])
+    assert costs == {'lc': 41, 'be1': 11, 'be2': 11}
+    cgps = [('lc', '/lc'), ('be1', '/be1'), ('be2', '/be2')]
+    selected, left = budget.select(cgps, set(['lc']), costs, (55, None))
+    assert selected == cgps[:2]
+    assert left == (3, None)
+    budget.update(['lc', 'be1', 'be2'], {'lc': 0, 'be1': 1}, [],
+                  ['lc', 'be1', 'be2'])
+    # the cgroup left out goes first in next window, the greedy fill takes
+    # the pinned one that still fits
+    selected, _ = budget.select(cgps, set(), costs, (25, None))
+    assert selected == [('be2', '/be2'), ('be1', '/be1')]
@@ -0,0 +1,82 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+This module tests libpgos through its Python wrapper, it needs libpgos.so
+built in pgos directory and root privilege to open cgroup perf events
+"""
+
+import os
+import time
+
+import pytest
+
+from pgos import Pgos
+
+PGOS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'pgos')
+CGROUP = '/sys/fs/cgroup/perf_event'
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(os.path.join(PGOS_DIR, 'libpgos.so')) or
+    not os.path.isdir(CGROUP) or os.geteuid() != 0,
+    reason='libpgos.so is not built or cgroup perf events are not allowed')
+
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_add_cgroup_then_collect_continuous(monkeypatch):
+    monkeypatch.chdir(PGOS_DIR)
+    pgos = Pgos(os.cpu_count(), 1000, continuous=True)
+    cgps = [('root', CGROUP)]
+    try:
+        # cgroup pooled ahead of collect must be enabled by collect
+        assert pgos.add_cgroup('root', CGROUP) == 0
+        _, _, index = pgos.collect(cgps)
+        assert index == {}
+        busy(0.2)
+        _, data, index = pgos.collect(cgps)
+        assert 'root' in index
+        row = data[index['root']]
+        assert row['instructions'] > 0
+        assert row['cycles'] > 0
+    finally:
+        pgos.fin_pgos()
+
+
+def test_kept_cgroup_yields_data_when_requested(monkeypatch):
+    monkeypatch.chdir(PGOS_DIR)
+    pgos = Pgos(os.cpu_count(), 1000, continuous=True)
+    cgps = [('root', CGROUP)]
+    try:
+        pgos.collect(cgps)
+        busy(0.2)
+        pgos.collect(cgps)
+        # skipped cgroup stays pooled and is read again in its next request
+        _, _, index = pgos.collect([])
+        assert 'root' in pgos._pooled
+        busy(0.2)
+        _, data, index = pgos.collect(cgps)
+        assert 'root' in index
+        assert data[index['root']]['cycles'] > 0
+    finally:
+        pgos.fin_pgos()
@@ -0,0 +1,75 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests recorded file round trip """
+
+import pandas as pd
+
+from recorder import Recorder, RecordFormat, read_records, record_times
+from replay import slice_records
+
+COLS = ['time', 'cid', 'name', 'cpi']
+ROWS = [[1700000000.0 + i * 10, 'c' + str(i % 2), 'n' + str(i % 2), 1.0 + i]
+        for i in range(6)]
+
+
+def write_records(path, fmt):
+    recorder = Recorder(str(path), COLS, fmt)
+    recorder.start()
+    for row in ROWS:
+        recorder.record(row)
+    recorder.stop()
+    return read_records(str(path))
+
+
+def test_binary_matches_csv(tmp_path):
+    binary = write_records(tmp_path / 'metric.bin', RecordFormat.BINARY)
+    csv = write_records(tmp_path / 'metric.csv', RecordFormat.CSV)
+    pd.testing.assert_frame_equal(binary, csv, check_dtype=False)
+
+
+def test_binary_slice_records(tmp_path):
+    frame = write_records(tmp_path / 'metric.bin', RecordFormat.BINARY)
+    times = record_times(pd.Series([row[0] for row in ROWS]))
+    start = times[1].isoformat()
+    end = times[4].isoformat()
+    sliced = slice_records(frame, start, end)
+    assert sliced['cpi'].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_util_times_are_kept(tmp_path):
+    path = tmp_path / 'util.bin'
+    recorder = Recorder(str(path), ['time', 'cid', 'util'],
+                        RecordFormat.BINARY)
+    recorder.start()
+    recorder.record(['2018-07-01T10:00:00', 'c0', 50.0])
+    recorder.stop()
+    frame = read_records(str(path))
+    assert frame['time'].tolist() == ['2018-07-01T10:00:00']
+    assert slice_records(frame, '2018-07-01 09:00:00').shape[0] == 1
+
+
+def test_long_name_truncated_by_character(tmp_path):
+    path = tmp_path / 'metric.bin'
+    name = 'a' + u'\u00e9' * 40
+    recorder = Recorder(str(path), COLS, RecordFormat.BINARY)
+    recorder.start()
+    recorder.record([1700000000.0, 'c0', name, 1.0])
+    recorder.stop()
+    frame = read_records(str(path))
+    assert frame['name'].tolist() == [name[:32]]
@@ -0,0 +1,46 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests container registry updated by Docker events """
+
+from registry import ContainerRegistry
+
+
+class FakeContainer(object):
+    def __init__(self, cid, name):
+        self.cid = cid
+        self.name = name
+
+
+def event(action, cid):
+    return {'Action': action, 'id': cid,
+            'Actor': {'Attributes': {'name': 'n' + cid}}}
+
+
+def test_restart_event_reported():
+    restarted = set(['c1', 'c2'])
+    registry = ContainerRegistry(None, FakeContainer,
+                                 on_event=restarted.discard)
+    registry._handle_event(event('start', 'c1'))
+    first = registry.snapshot()['c1']
+    registry._handle_event(event('die', 'c1'))
+    restarted.add('c1')
+    registry._handle_event(event('start', 'c1'))
+    registry._handle_event(event('pause', 'c2'))
+    assert restarted == set(['c2'])
+    assert registry.snapshot()['c1'] is not first
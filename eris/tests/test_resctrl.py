@@ -0,0 +1,144 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests resctrl control against a fake resctrl tree """
+
+import errno
+import os
+
+import pytest
+
+import resctrl
+
+from llcoccup import LlcOccup
+from resctrl import GroupMonitor, Resctrl
+
+
+class FakeContainer(object):
+
+    def __init__(self, name, pids):
+        self.name = name
+        self.pids = pids
+
+
+@pytest.fixture
+def root(tmp_path):
+    os.makedirs(str(tmp_path / 'info' / 'L3'))
+    (tmp_path / 'info' / 'L3' / 'cbm_mask').write_text(u'7ff\n')
+    (tmp_path / 'schemata').write_text(u'L3:0=7ff;1=7ff\nMB:0=100;1=100\n')
+    return tmp_path
+
+
+def make_group(root, name):
+    group = Resctrl(str(root)).group(name)
+    # kernel creates tasks file in new group
+    open(os.path.join(group.path, 'tasks'), 'w').close()
+    return group
+
+
+def test_resctrl_info(root):
+    fs = Resctrl(str(root))
+    assert fs.cbm_mask() == 0x7ff
+    assert fs.domains('L3') == ['0', '1']
+
+
+def test_write_schemata_retried_after_failed_read_back(root, monkeypatch):
+    make_group(root, LlcOccup.BE_GROUP)
+    llc = LlcOccup(0, False, Resctrl(str(root)))
+    read_schemata = resctrl.read_schemata
+    rejected = []
+
+    def reject_once(path):
+        # kernel keeps old bitmask when the written one is rejected
+        if not rejected and path.endswith(LlcOccup.BE_GROUP):
+            rejected.append(path)
+            return {'L3': {'0': '7ff', '1': '7ff'}}
+        return read_schemata(path)
+
+    monkeypatch.setattr(resctrl, 'read_schemata', reject_once)
+    bes = [FakeContainer('be', ['1'])]
+    llc.budgeting(bes, [])
+    assert rejected
+    assert LlcOccup.BE_GROUP not in llc.cls_bmp
+
+    llc.budgeting(bes, [])
+    mask = llc.be_bmp[llc.quota_level]
+    assert llc.cls_bmp[LlcOccup.BE_GROUP] == mask
+    assert resctrl.read_schemata(str(root / LlcOccup.BE_GROUP))['L3'] == {
+        '0': mask[2:], '1': mask[2:]}
+
+
+def test_sync_tasks_writes_new_threads_only(root, monkeypatch):
+    group = make_group(root, 'BE_Group')
+    tasks = os.path.join(group.path, 'tasks')
+    assert group.sync_tasks(['1', '2']) == []
+    assert group.sync_tasks(['1', '2', '3']) == []
+    with open(tasks) as tasksf:
+        assert tasksf.read() == '1\n2\n3\n'
+
+    write = os.write
+
+    def fail_write(fd, data):
+        if data == b'4\n':
+            raise OSError(errno.ESRCH, 'exited')
+        if data == b'5\n':
+            raise OSError(errno.EINVAL, 'invalid')
+        return write(fd, data)
+
+    monkeypatch.setattr(os, 'write', fail_write)
+    # exited thread is ignored, thread failed to move is retried
+    assert group.sync_tasks(['1', '2', '3', '4', '5']) == ['5']
+    assert '4' in group.pids
+    assert '5' not in group.pids
+    monkeypatch.setattr(os, 'write', write)
+    assert group.sync_tasks(['1', '2', '3', '4', '5']) == []
+    with open(tasks) as tasksf:
+        assert tasksf.read() == '1\n2\n3\n5\n'
+
+
+def write_mon_data(group, dom, values):
+    path = os.path.join(group.path, 'mon_data', 'mon_L3_%02d' % dom)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for event, value in values.items():
+        with open(os.path.join(path, event), 'w') as evtf:
+            evtf.write(str(value) + '\n')
+
+
+def test_group_monitor_reads_mon_data(root, monkeypatch):
+    group = make_group(root, 'LC_Group')
+    mb = 1024 * 1024
+    write_mon_data(group, 0, {'llc_occupancy': 2048 * 1024,
+                              'mbm_local_bytes': 10 * mb,
+                              'mbm_total_bytes': 30 * mb})
+    write_mon_data(group, 1, {'llc_occupancy': 1024,
+                              'mbm_local_bytes': 'Unavailable',
+                              'mbm_total_bytes': 0})
+    now = [100.0]
+    monkeypatch.setattr(resctrl.time, 'time', lambda: now[0])
+    monitor = GroupMonitor(group)
+    assert monitor.sample() == {'0': (2048, 0.0, 0.0), '1': (1, 0.0, 0.0)}
+
+    write_mon_data(group, 0, {'llc_occupancy': 1024 * 1024,
+                              'mbm_local_bytes': 30 * mb,
+                              'mbm_total_bytes': 70 * mb})
+    now[0] = 102.0
+    res = monitor.sample()
+    # local 20 MB and remote 20 MB in 2 seconds
+    assert res['0'] == (1024, 10.0, 10.0)
+    assert res['1'] == (1, 0.0, 0.0)
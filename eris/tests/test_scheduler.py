@@ -0,0 +1,49 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests periodic task scheduler """
+
+import time
+
+from scheduler import Scheduler
+
+
+class Context(object):
+    def __init__(self):
+        self.shutdown = False
+        self.cycles = 0
+
+
+def test_interval_changed_in_cycle_is_not_overrun():
+    ctx = Context()
+    observed = []
+
+    def cycle(ctx):
+        ctx.cycles += 1
+        if ctx.cycles == 1:
+            # long cycle shrinks interval as adaptive metric interval does
+            time.sleep(0.15)
+            scheduler.set_interval('metric', 0.02)
+        else:
+            ctx.shutdown = True
+
+    scheduler = Scheduler(ctx, observer=lambda *args: observed.append(args))
+    scheduler.add_task('metric', cycle, 0.2)
+    scheduler.run()
+    assert [skipped for _, _, _, skipped in observed] == [0, 0]
+    assert scheduler.stats['metric'].overruns == 0
@@ -0,0 +1,90 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+""" This module tests closed loop simulation on binary recorded files """
+
+import json
+import sys
+
+from datetime import datetime
+
+import simulate
+
+from analyze.analyzer import Metric
+from recorder import Recorder, RecordFormat
+
+METRIC_COLS = ['time', 'cid', 'name', Metric.INST, Metric.CYC, Metric.CPI,
+               Metric.L3MPKI, Metric.L3MISS, Metric.NF, Metric.UTIL,
+               Metric.L3OCC, Metric.MBL, Metric.MBR, Metric.L2STALL,
+               Metric.MEMSTALL, Metric.L2SPKI, Metric.MSPKI]
+CONS = [('aaa', 'lc1', 80), ('bbb', 'be1', 150)]
+START = 1700000000
+
+
+def record(path, cols, rows):
+    recorder = Recorder(str(path), cols, RecordFormat.BINARY)
+    recorder.start()
+    for row in rows:
+        recorder.record(row)
+    recorder.stop()
+
+
+def write_inputs(tmp_path):
+    util_rows = []
+    metric_rows = []
+    for cycle in range(12):
+        epoch = START + cycle * 2
+        date = datetime.fromtimestamp(epoch).isoformat()
+        for cid, name, util in CONS:
+            util_rows.append((date, cid, name, util))
+        util_rows.append((date, '', 'lcs', 80))
+        util_rows.append((date, '', 'loadavg1m', 1.0))
+        if cycle % 4 == 3:
+            for cid, name, util in CONS:
+                # LC CPI is above its threshold in every metrics cycle
+                metric_rows.append((epoch, cid, name, 1e9, 2e9, 2.0, 0.2,
+                                    2e5, 2000, util, 1024 * (cycle + 1),
+                                    100.0, 10.0, 1000, 1000, 1.0, 1.0))
+    record(tmp_path / 'util.bin', ['time', 'cid', 'name', Metric.UTIL],
+           util_rows)
+    record(tmp_path / 'metric.bin', METRIC_COLS, metric_rows)
+    (tmp_path / 'workload.json').write_text(json.dumps({
+        'lc1': {'cpus': 2, 'type': 'latency_critical'},
+        'be1': {'cpus': 2, 'type': 'best_efforts'}}))
+    (tmp_path / 'thresh.json').write_text(json.dumps({
+        'lcutilmax': 400,
+        'lc1': {'metrics_threshold': [{
+            'util_start': 0, 'util_end': 500, 'cpi': 1.5, 'mpki': 5,
+            'mb': 10, 'mspki': 100, 'l2spki': 1}], 'tdp_threshold': {}}}))
+
+
+def test_simulate_binary_records(tmp_path, monkeypatch, capsys):
+    write_inputs(tmp_path)
+    monkeypatch.setattr(sys, 'argv', [
+        'simulate.py', '-d', '-c', '-t', str(tmp_path / 'thresh.json'),
+        '--util-file', str(tmp_path / 'util.bin'),
+        '--metric-file', str(tmp_path / 'metric.bin'),
+        str(tmp_path / 'workload.json')])
+    simulate.main()
+    out = capsys.readouterr().out
+    # rows of LC utilization sum and load average are not containers
+    assert 'lcs' not in out
+    assert 'loadavg1m' not in out
+    assert 'actuations in simulation' in out
+    assert 'actuation BE_Group/schemata' in out
+    assert 'container be1 cpu share' in out
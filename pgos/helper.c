@@ -15,6 +15,7 @@
 //
 // SPDX-License-Identifier: Apache-2.0
 //
+#include <time.h>
 #include "helper.h"
 
 void set_attr_disabled(struct perf_event_attr *attr, int disabled) {
@@ -23,4 +24,14 @@ void set_attr_disabled(struct perf_event_attr *attr, int disabled) {
 
 struct cgroup* get_cgroup(struct cgroup *cgroups, int index) {
     return cgroups + index;
+}
+
+struct sample* get_sample(struct sample *samples, int index) {
+    return samples + index;
+}
+
+uint64_t monotonic_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
 }
\ No newline at end of file
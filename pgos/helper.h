@@ -20,12 +20,29 @@
 #include <linux/perf_event.h>
 #include <stdint.h>
 
+#define MAX_SOCKETS 8
+#define MAX_EVENTS 16
+#define MAX_CPUS 1024
+
 struct cgroup {
     int ret;
     char* path;
     char* cid;
     uint64_t instructions, cycles, llc_misses, stalls_l2_misses, stalls_memory_load, llc_occupancy;
     double mbm_local, mbm_remote;
+    uint64_t socket_instructions[MAX_SOCKETS], socket_cycles[MAX_SOCKETS], socket_llc_misses[MAX_SOCKETS];
+    uint64_t socket_stalls_l2_misses[MAX_SOCKETS], socket_stalls_memory_load[MAX_SOCKETS];
+    double ratio;
+    uint64_t extra[MAX_EVENTS];
+    double extra_ratio[MAX_EVENTS];
+    uint64_t cpu_mask[MAX_CPUS / 64];
+    int keep;
+};
+
+struct sample {
+    uint64_t timestamp, duration;
+    uint64_t instructions, cycles, llc_misses, stalls_l2_misses, stalls_memory_load;
+    uint64_t extra[MAX_EVENTS];
 };
 
 struct context {
@@ -36,9 +53,15 @@ struct context {
 
     uint64_t timestamp;
     struct cgroup *cgroups;
+    int samples;
+    struct sample *sample_buf;
 };
 
 struct cgroup* get_cgroup(struct cgroup *cgroups, int index);
 
+struct sample* get_sample(struct sample *samples, int index);
+
+uint64_t monotonic_ns(void);
+
 void set_attr_disabled(struct perf_event_attr *attr, int disabled);
 #endif
\ No newline at end of file
@@ -31,12 +31,17 @@ package main
 // #cgo LDFLAGS: -Wl,-z,now
 // #include <pqos.h>
 // #include "pgos.h"
+// #include "perf.h"
 // #include "helper.h"
 import "C"
 import (
 	"fmt"
+	"io/ioutil"
 	"os"
+	"sort"
+	"strconv"
 	"strings"
+	"sync"
 	"syscall"
 	"time"
 	"unsafe"
@@ -54,35 +59,82 @@ const (
 	ErrorCannotOpenCgroup    C.int = 1 << iota
 	ErrorCannotOpenTasks     C.int = 1 << iota
 	ErrorCannotPerfomSyscall C.int = 1 << iota
+	ErrorNoPreviousSample    C.int = 1 << iota
+	ErrorTooManyEvents       C.int = 1 << iota
 )
 
+// maximal number of events in one extra event group, extra events are
+// split into groups so that every group fits in general purpose counters
+const maxGroupEvents = 4
+
 var coreCount int
+
+// socket index of every core, sockets are numbered densely in order of
+// physical package id
+var coreSocket []int
+var socketCount int
 var metricsDescription = []string{"instructions", "cycles", "LLC misses", "stalls L2 miss", "stalls memory load"}
 
+// PerfCounter is one perf event, config of model specific event is index
+// of the event in CPU model event table
 type PerfCounter struct {
-	Type   C.uint32_t
-	Config C.uint64_t
+	Type          C.uint32_t
+	Config        C.uint64_t
+	ModelSpecific bool
+}
+
+func (this PerfCounter) config() C.uint64_t {
+	if this.ModelSpecific {
+		return C.get_config_of_event(this.Type, this.Config)
+	}
+	return this.Config
 }
 
 var counters = []PerfCounter{
 	PerfCounter{Type: C.PERF_TYPE_HARDWARE, Config: C.PERF_COUNT_HW_INSTRUCTIONS},
 	PerfCounter{Type: C.PERF_TYPE_HARDWARE, Config: C.PERF_COUNT_HW_CPU_CYCLES},
 	PerfCounter{Type: C.PERF_TYPE_HARDWARE, Config: C.PERF_COUNT_HW_CACHE_MISSES},
-	PerfCounter{Type: C.PERF_TYPE_RAW, Config: C.uint64_t(CYCLE_ACTIVITY_STALLS_L2_MISS)},
-	PerfCounter{Type: C.PERF_TYPE_RAW, Config: C.uint64_t(CYCLE_ACTIVITY_STALLS_MEM_ANY)},
+	PerfCounter{Type: C.PERF_TYPE_RAW, Config: C.uint64_t(CYCLE_ACTIVITY_STALLS_L2_MISS), ModelSpecific: true},
+	PerfCounter{Type: C.PERF_TYPE_RAW, Config: C.uint64_t(CYCLE_ACTIVITY_STALLS_MEM_ANY), ModelSpecific: true},
+}
+
+// configurable events counted in extra groups besides counters
+var extraCounters = []PerfCounter{}
+
+func extraGroups() int {
+	return (len(extraCounters) + maxGroupEvents - 1) / maxGroupEvents
 }
 
 type Cgroup struct {
-	Index       int
-	Path        string
-	Name        string
-	Pid         uint32
-	File        *os.File `json:"-"`
-	Leaders     []uintptr
-	Followers   []uintptr
-	PgosHandler C.int
+	Index        int
+	Path         string
+	Name         string
+	Pid          uint32
+	File         *os.File `json:"-"`
+	Leaders      []uintptr
+	ExtraLeaders []uintptr
+	Followers    []uintptr
+	Cpus         []int
+	Started      bool
+	PgosHandler  C.int
+	PgosStarted  bool
+	PgosPids     map[C.pid_t]bool
+	LastPoll     time.Time
+	LeaderReads  []PerfStruct
+	ExtraReads   []PerfStruct
+	LastRead     time.Time
+	Sampled      bool
 }
 
+// cgroups with perf event fds kept open between collect calls, keyed by
+// cgroup path
+var cgroupPool = map[string]*Cgroup{}
+var poolLock sync.Mutex
+
+// time of previous collect_continuous, counts are reported for the window
+// since then
+var lastContinuous time.Time
+
 var pqosEnabled bool = false
 var pqosLog *os.File
 
@@ -109,27 +161,218 @@ func pgos_init() C.int {
 
 //export pgos_finalize
 func pgos_finalize() {
+	poolLock.Lock()
+	for path, c := range cgroupPool {
+		c.Close()
+		delete(cgroupPool, path)
+	}
+	poolLock.Unlock()
 	if pqosEnabled {
 		pqosLog.Close()
 		C.pqos_fini()
 	}
 }
 
-//export collect
-func collect(ctx C.struct_context) C.struct_context {
-	ctx.ret = 0
-	coreCount = int(ctx.core)
+//export pgos_add_cgroup
+func pgos_add_cgroup(path *C.char, cid *C.char, core C.int, mask *C.uint64_t) C.int {
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	setCoreCount(int(core))
+	_, code := addCgroup(C.GoString(path), C.GoString(cid), maskCpus(mask), false)
+	return code
+}
 
-	cgroups := make([]*Cgroup, 0, int(ctx.cgroup_count))
+//export pgos_set_events
+func pgos_set_events(count C.int, types *C.uint32_t, configs *C.uint64_t) C.int {
+	if count < 0 || count > C.MAX_EVENTS {
+		return ErrorTooManyEvents
+	}
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	// pooled cgroups are opened again with new events on next use
+	for path := range cgroupPool {
+		removeCgroup(path)
+	}
+	extraCounters = make([]PerfCounter, int(count))
+	if count == 0 {
+		return 0
+	}
+	typeSlice := (*[C.MAX_EVENTS]C.uint32_t)(unsafe.Pointer(types))[:count:count]
+	configSlice := (*[C.MAX_EVENTS]C.uint64_t)(unsafe.Pointer(configs))[:count:count]
+	for i := range extraCounters {
+		extraCounters[i] = PerfCounter{Type: typeSlice[i], Config: configSlice[i]}
+	}
+	return 0
+}
+
+//export pgos_remove_cgroup
+func pgos_remove_cgroup(path *C.char) {
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	removeCgroup(C.GoString(path))
+}
 
+// setCoreCount sets core count and reads socket of every core from sysfs
+// topology, cores with unknown socket are counted in socket 0
+func setCoreCount(core int) {
+	coreCount = core
+	if len(coreSocket) == core {
+		return
+	}
+	packages := make([]int, core)
+	seen := map[int]bool{}
+	for i := 0; i < core; i++ {
+		path := fmt.Sprintf("/sys/devices/system/cpu/cpu%d/topology/physical_package_id", i)
+		if data, err := ioutil.ReadFile(path); err == nil {
+			if id, err := strconv.Atoi(strings.TrimSpace(string(data))); err == nil {
+				packages[i] = id
+			}
+		}
+		seen[packages[i]] = true
+	}
+	ids := make([]int, 0, len(seen))
+	for id := range seen {
+		ids = append(ids, id)
+	}
+	sort.Ints(ids)
+	index := map[int]int{}
+	for i, id := range ids {
+		if i >= C.MAX_SOCKETS {
+			i = C.MAX_SOCKETS - 1
+		}
+		index[id] = i
+	}
+	coreSocket = make([]int, core)
+	for i := 0; i < core; i++ {
+		coreSocket[i] = index[packages[i]]
+	}
+	socketCount = len(ids)
+	if socketCount > C.MAX_SOCKETS {
+		socketCount = C.MAX_SOCKETS
+	}
+}
+
+//export pgos_socket_count
+func pgos_socket_count(core C.int) C.int {
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	setCoreCount(int(core))
+	return C.int(socketCount)
+}
+
+// maskCpus returns cores set in cpu mask, all cores if mask is nil or has
+// no existing core set
+func maskCpus(mask *C.uint64_t) []int {
+	cpus := make([]int, 0, coreCount)
+	if mask != nil {
+		words := (*[C.MAX_CPUS / 64]C.uint64_t)(unsafe.Pointer(mask))
+		for i := 0; i < coreCount && i < C.MAX_CPUS; i++ {
+			if words[i/64]&(1<<uint(i%64)) != 0 {
+				cpus = append(cpus, i)
+			}
+		}
+	}
+	if len(cpus) == 0 {
+		for i := 0; i < coreCount; i++ {
+			cpus = append(cpus, i)
+		}
+	}
+	return cpus
+}
+
+func sameCpus(a, b []int) bool {
+	if len(a) != len(b) {
+		return false
+	}
+	for i := range a {
+		if a[i] != b[i] {
+			return false
+		}
+	}
+	return true
+}
+
+// addCgroup returns pooled cgroup of given path, perf event fds are opened
+// only if the cgroup is not in pool yet or its cpus are changed, counters
+// of new or pooled but stopped cgroup are enabled if start is set
+func addCgroup(path string, cid string, cpus []int, start bool) (*Cgroup, C.int) {
+	if c, ok := cgroupPool[path]; ok {
+		if sameCpus(c.Cpus, cpus) {
+			if start && !c.Started {
+				if code := c.Start(); code != 0 {
+					return nil, code
+				}
+			}
+			return c, 0
+		}
+		removeCgroup(path)
+	}
+	c, code := NewCgroup(path, cid, 0, cpus)
+	if code != 0 {
+		return nil, code
+	}
+	if start {
+		code = c.Start()
+		if code != 0 {
+			c.Close()
+			return nil, code
+		}
+	}
+	cgroupPool[path] = c
+	return c, 0
+}
+
+func removeCgroup(path string) {
+	if c, ok := cgroupPool[path]; ok {
+		c.Close()
+		delete(cgroupPool, path)
+	}
+}
+
+// reconcileCgroups returns pooled cgroups requested in context, cgroups not
+// requested any more are closed. Cgroups requested with keep flag stay in
+// pool with their perf events and RDT monitoring group but are not returned
+func reconcileCgroups(ctx C.struct_context, start bool) []*Cgroup {
+	requested := make(map[string]bool, int(ctx.cgroup_count))
+	cgroups := make([]*Cgroup, 0, int(ctx.cgroup_count))
 	for i := 0; i < int(ctx.cgroup_count); i++ {
 		cg := C.get_cgroup(ctx.cgroups, C.int(i))
 		cg.ret = 0
 		path, cid := C.GoString(cg.path), C.GoString(cg.cid)
-		c, code := NewCgroup(path, cid, i)
-		cg.ret |= code
-		if c != nil && pqosEnabled {
-			cg.ret |= c.GetPgosHandler()
+		requested[path] = true
+		if cg.keep != 0 {
+			// counters of kept cgroup run on in continuous mode, its next
+			// read is scaled to the window of that collect
+			continue
+		}
+		c, code := addCgroup(path, cid, maskCpus(&cg.cpu_mask[0]), start)
+		if code != 0 {
+			cg.ret |= code
+			continue
+		}
+		c.Index = i
+		cgroups = append(cgroups, c)
+	}
+	for path := range cgroupPool {
+		if !requested[path] {
+			removeCgroup(path)
+		}
+	}
+	return cgroups
+}
+
+//export collect
+func collect(ctx C.struct_context) C.struct_context {
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	ctx.ret = 0
+	setCoreCount(int(ctx.core))
+
+	cgroups := make([]*Cgroup, 0, int(ctx.cgroup_count))
+	for _, c := range reconcileCgroups(ctx, false) {
+		cg := C.get_cgroup(ctx.cgroups, C.int(c.Index))
+		if pqosEnabled {
+			cg.ret |= c.SyncPgos()
 		}
 		if cg.ret == 0 {
 			cgroups = append(cgroups, c)
@@ -138,50 +381,197 @@ func collect(ctx C.struct_context) C.struct_context {
 	now := time.Now().Unix()
 	ctx.timestamp = C.uint64_t(now)
 	for j := 0; j < len(cgroups); j++ {
-		for k := 0; k < len(cgroups[j].Leaders); k++ {
-			cg := C.get_cgroup(ctx.cgroups, C.int(cgroups[j].Index))
-			code := StartLeader(cgroups[j].Leaders[k])
-			cg.ret |= code
-		}
+		cg := C.get_cgroup(ctx.cgroups, C.int(cgroups[j].Index))
+		cg.ret |= cgroups[j].Start()
+	}
+	var window [][]uint64
+	if ctx.samples > 1 && ctx.sample_buf != nil {
+		window = collectSamples(ctx, cgroups)
+	} else {
+		time.Sleep(time.Duration(ctx.period) * time.Millisecond)
 	}
-	time.Sleep(time.Duration(ctx.period) * time.Millisecond)
 	for j := 0; j < len(cgroups); j++ {
 		cg := C.get_cgroup(ctx.cgroups, C.int(cgroups[j].Index))
-		res := make([]uint64, len(counters))
-		for k := 0; k < coreCount; k++ {
-			code := StopLeader(cgroups[j].Leaders[k])
-			cg.ret |= code
-			result, code := ReadLeader(cgroups[j].Leaders[k])
-			cg.ret |= code
-			for l := 0; l < len(counters); l++ {
-				res[l] += result.Data[l].Value
-			}
-		}
+		cg.ret |= cgroups[j].Stop()
+		res, code := cgroups[j].Read()
+		cg.ret |= code
 		if cg.ret != 0 {
 			continue
 		}
+		if window != nil && len(window[j]) == len(res) {
+			// window is the sub-sample deltas plus the rest since last one
+			for l := range res {
+				res[l] += window[j][l]
+			}
+		}
 
-		cg.instructions = C.uint64_t(res[0])
-		cg.cycles = C.uint64_t(res[1])
-		cg.llc_misses = C.uint64_t(res[2])
-		cg.stalls_l2_misses = C.uint64_t(res[3])
-		cg.stalls_memory_load = C.uint64_t(res[4])
-
+		setCounters(cg, res)
 		if pqosEnabled {
-			pgosValue := C.pgos_mon_poll(cgroups[j].PgosHandler)
-			cg.llc_occupancy = pgosValue.llc / 1024
-			cg.mbm_local = C.double(float64(pgosValue.mbm_local_delta) / 1024.0 / 1024.0 / (float64(ctx.period) / 1000.0))
-			cg.mbm_remote = C.double(float64(pgosValue.mbm_remote_delta) / 1024.0 / 1024.0 / (float64(ctx.period) / 1000.0))
+			cgroups[j].PollPgos(cg, time.Now())
 		}
-		cgroups[j].Close()
 	}
+	return ctx
+}
+
+// collectSamples sleeps through the counting window in ctx.samples equal
+// steps and reads counters of every cgroup after each step without stopping
+// them, every sub-sample holds counter deltas since previous read with its
+// monotonic timestamp and measured duration in nanoseconds. Returns sum of
+// sub-sample results of every cgroup
+func collectSamples(ctx C.struct_context, cgroups []*Cgroup) [][]uint64 {
+	samples := int(ctx.samples)
+	window := make([][]uint64, len(cgroups))
+	lastTime := make([]uint64, len(cgroups))
+	for j := range cgroups {
+		lastTime[j] = uint64(C.monotonic_ns())
+	}
+	begin := time.Now()
+	period := time.Duration(ctx.period) * time.Millisecond
+	for k := 0; k < samples; k++ {
+		// steps are aligned to window start so read time does not drift
+		time.Sleep(time.Until(begin.Add(period * time.Duration(k+1) / time.Duration(samples))))
+		for j, c := range cgroups {
+			s := C.get_sample(ctx.sample_buf, C.int(c.Index*samples+k))
+			res, code := c.Read()
+			now := uint64(C.monotonic_ns())
+			if code != 0 {
+				*s = C.struct_sample{}
+			} else {
+				setSample(s, res, now, now-lastTime[j])
+				if window[j] == nil {
+					window[j] = make([]uint64, len(res))
+				}
+				for l := range res {
+					window[j][l] += res[l]
+				}
+			}
+			lastTime[j] = now
+		}
+	}
+	return window
+}
+
+// setSample sets one sub-sample from result of Read
+func setSample(s *C.struct_sample, res []uint64, timestamp, duration uint64) {
+	s.timestamp = C.uint64_t(timestamp)
+	s.duration = C.uint64_t(duration)
+	s.instructions = C.uint64_t(res[0])
+	s.cycles = C.uint64_t(res[1])
+	s.llc_misses = C.uint64_t(res[2])
+	s.stalls_l2_misses = C.uint64_t(res[3])
+	s.stalls_memory_load = C.uint64_t(res[4])
+	for k := range extraCounters {
+		s.extra[k] = C.uint64_t(res[len(counters)+k])
+	}
+}
+
+//export collect_continuous
+func collect_continuous(ctx C.struct_context) C.struct_context {
+	poolLock.Lock()
+	defer poolLock.Unlock()
+	ctx.ret = 0
+	setCoreCount(int(ctx.core))
+	now := time.Now()
+	ctx.timestamp = C.uint64_t(now.Unix())
+
+	window := now.Sub(lastContinuous)
+	lastContinuous = now
+
+	cgroups := reconcileCgroups(ctx, true)
+	for _, c := range cgroups {
+		cg := C.get_cgroup(ctx.cgroups, C.int(c.Index))
+		span := now.Sub(c.LastRead)
+		res, code := c.Read()
+		if code != 0 {
+			cg.ret |= code
+			continue
+		}
+		c.LastRead = now
+		// first read only closes the interval started by Start
+		if !c.Sampled {
+			cg.ret |= ErrorNoPreviousSample
+		} else {
+			if span > window {
+				// cgroup kept without read in previous collects
+				scaleCounts(res, float64(window)/float64(span))
+			}
+			setCounters(cg, res)
+			if pqosEnabled && c.PgosStarted {
+				c.PollPgos(cg, now)
+			}
+		}
+		c.Sampled = true
+	}
+
+	// tasks started since the poll are monitored in the next window
 	if pqosEnabled {
-		C.pgos_mon_stop()
+		for _, c := range cgroups {
+			c.SyncPgos()
+		}
 	}
 	return ctx
 }
 
-func NewCgroup(path string, cid string, index int) (*Cgroup, C.int) {
+// scaleCounts scales counters of all cores and of every socket in result of
+// Read by ratio, times are kept so running ratios are not changed
+func scaleCounts(res []uint64, ratio float64) {
+	events := len(counters) + len(extraCounters)
+	for i := range res[:(socketCount+1)*events] {
+		res[i] = uint64(float64(res[i]) * ratio)
+	}
+}
+
+// setCounters sets counters from result of Read, which holds counters of
+// all cores followed by counters of every socket and times of every group
+func setCounters(cg *C.struct_cgroup, res []uint64) {
+	events := len(counters) + len(extraCounters)
+	times := res[(socketCount+1)*events:]
+	cg.instructions = C.uint64_t(res[0])
+	cg.cycles = C.uint64_t(res[1])
+	cg.llc_misses = C.uint64_t(res[2])
+	cg.stalls_l2_misses = C.uint64_t(res[3])
+	cg.stalls_memory_load = C.uint64_t(res[4])
+	cg.ratio = runningRatio(times[0:])
+	for k := range extraCounters {
+		cg.extra[k] = C.uint64_t(res[len(counters)+k])
+		cg.extra_ratio[k] = runningRatio(times[2*(1+k/maxGroupEvents):])
+	}
+	for s := 0; s < socketCount; s++ {
+		sres := res[(s+1)*events:]
+		cg.socket_instructions[s] = C.uint64_t(sres[0])
+		cg.socket_cycles[s] = C.uint64_t(sres[1])
+		cg.socket_llc_misses[s] = C.uint64_t(sres[2])
+		cg.socket_stalls_l2_misses[s] = C.uint64_t(sres[3])
+		cg.socket_stalls_memory_load[s] = C.uint64_t(sres[4])
+	}
+}
+
+// runningRatio returns time running over time enabled of one group, less
+// than 1 means the group was multiplexed and its counts are scaled
+func runningRatio(times []uint64) C.double {
+	if times[0] == 0 {
+		return 0
+	}
+	return C.double(float64(times[1]) / float64(times[0]))
+}
+
+// PollPgos sets LLC occupancy and memory bandwidth from the running RDT
+// monitoring group, bandwidth is averaged since previous poll
+func (this *Cgroup) PollPgos(cg *C.struct_cgroup, now time.Time) {
+	pgosValue := C.pgos_mon_poll(this.PgosHandler)
+	seconds := now.Sub(this.LastPoll).Seconds()
+	this.LastPoll = now
+	cg.llc_occupancy = pgosValue.llc / 1024
+	if seconds <= 0 {
+		return
+	}
+	cg.mbm_local = C.double(float64(pgosValue.mbm_local_delta) / 1024.0 / 1024.0 / seconds)
+	cg.mbm_remote = C.double(float64(pgosValue.mbm_remote_delta) / 1024.0 / 1024.0 / seconds)
+}
+
+// NewCgroup opens perf events of cgroup on given cpus only, events on cpus
+// the cgroup may not run on would never count
+func NewCgroup(path string, cid string, index int, cpus []int) (*Cgroup, C.int) {
 	cgroupFile, err := os.Open(path)
 	if err != nil {
 		return nil, ErrorCannotOpenCgroup
@@ -193,56 +583,207 @@ func NewCgroup(path string, cid string, index int) (*Cgroup, C.int) {
 	} else {
 		cgroupName = cid
 	}
-	leaders := make([]uintptr, 0, coreCount)
-	followers := make([]uintptr, 0, coreCount*(len(counters)-1))
+	c := &Cgroup{
+		Index:        index,
+		Path:         path,
+		Name:         cgroupName,
+		File:         cgroupFile,
+		Leaders:      make([]uintptr, 0, len(cpus)),
+		ExtraLeaders: make([]uintptr, 0, len(cpus)*extraGroups()),
+		Followers:    make([]uintptr, 0, len(cpus)*(len(counters)+len(extraCounters)-1)),
+		Cpus:         cpus,
+	}
 
-	for i := 0; i < coreCount; i++ {
-		l, code := OpenLeader(cgroupFile.Fd(), uintptr(i), counters[0].Type, counters[0].Config)
+	for _, i := range cpus {
+		l, code := c.openGroup(uintptr(i), counters)
 		if code != 0 {
+			c.Close()
 			return nil, code
 		}
-		leaders = append(leaders, l)
-		for j := 1; j < len(counters); j++ {
-			f, code := OpenFollower(l, uintptr(i), counters[j].Type, counters[j].Config)
+		c.Leaders = append(c.Leaders, l)
+		for g := 0; g < extraGroups(); g++ {
+			end := (g + 1) * maxGroupEvents
+			if end > len(extraCounters) {
+				end = len(extraCounters)
+			}
+			l, code := c.openGroup(uintptr(i), extraCounters[g*maxGroupEvents:end])
 			if code != 0 {
+				c.Close()
 				return nil, code
 			}
-			followers = append(followers, f)
+			c.ExtraLeaders = append(c.ExtraLeaders, l)
+		}
+	}
+	return c, 0
+}
+
+// openGroup opens events of one group on cpu, first event is the leader
+func (this *Cgroup) openGroup(cpu uintptr, events []PerfCounter) (uintptr, C.int) {
+	l, code := OpenLeader(this.File.Fd(), cpu, events[0].Type, events[0].config())
+	if code != 0 {
+		return 0, code
+	}
+	for j := 1; j < len(events); j++ {
+		f, code := OpenFollower(l, cpu, events[j].Type, events[j].config())
+		if code != 0 {
+			syscall.Close(int(l))
+			return 0, code
 		}
+		this.Followers = append(this.Followers, f)
 	}
-	return &Cgroup{
-		Index:     index,
-		Path:      path,
-		Name:      cgroupName,
-		File:      cgroupFile,
-		Leaders:   leaders,
-		Followers: followers,
-	}, 0
+	return l, 0
 }
 
-func (this *Cgroup) GetPgosHandler() (code C.int) {
-	f, err := os.OpenFile(this.Path+"/tasks", os.O_RDONLY, os.ModePerm)
+// readTasks returns thread ids in tasks file of cgroup
+func (this *Cgroup) readTasks() ([]C.pid_t, C.int) {
+	data, err := ioutil.ReadFile(this.Path + "/tasks")
 	if err != nil {
-		code = ErrorCannotOpenTasks
-		return
+		return nil, ErrorCannotOpenTasks
 	}
-	defer f.Close()
-	pids := []C.pid_t{}
-	for {
-		var pid uint32
-		n, err := fmt.Fscanf(f, "%d\n", &pid)
-		if n == 0 || err != nil {
-			break
+	fields := strings.Fields(string(data))
+	pids := make([]C.pid_t, 0, len(fields))
+	for _, field := range fields {
+		if pid, err := strconv.ParseUint(field, 10, 32); err == nil {
+			pids = append(pids, C.pid_t(pid))
 		}
-		pids = append(pids, C.pid_t(pid))
+	}
+	return pids, 0
+}
+
+// SyncPgos keeps RDT monitoring group of cgroup running with its current
+// tasks, the group is started at first call and lives until the cgroup is
+// closed, later calls only add new tasks and remove exited ones so that
+// RMID and occupancy accounting are kept
+func (this *Cgroup) SyncPgos() C.int {
+	pids, code := this.readTasks()
+	if code != 0 {
+		return code
 	}
 	if len(pids) == 0 {
-		code = ErrorCannotOpenTasks
-		return
+		return ErrorCannotOpenTasks
+	}
+	if !this.PgosStarted {
+		this.PgosHandler = C.pgos_mon_start_pids(C.unsigned(len(pids)), &pids[0])
+		if this.PgosHandler < 0 {
+			return ErrorCannotPerfomSyscall
+		}
+		// first poll sets base of bandwidth deltas
+		C.pgos_mon_poll(this.PgosHandler)
+		this.LastPoll = time.Now()
+		this.PgosStarted = true
+		this.PgosPids = make(map[C.pid_t]bool, len(pids))
+		for _, pid := range pids {
+			this.PgosPids[pid] = true
+		}
+		return 0
 	}
-	this.PgosHandler = C.pgos_mon_start_pids(C.unsigned(len(pids)), (*C.pid_t)(unsafe.Pointer(&pids[0])))
 
-	return
+	current := make(map[C.pid_t]bool, len(pids))
+	added := []C.pid_t{}
+	for _, pid := range pids {
+		current[pid] = true
+		if !this.PgosPids[pid] {
+			added = append(added, pid)
+		}
+	}
+	removed := []C.pid_t{}
+	for pid := range this.PgosPids {
+		if !current[pid] {
+			removed = append(removed, pid)
+		}
+	}
+	if len(added) > 0 && C.pgos_mon_add_pids(this.PgosHandler, C.unsigned(len(added)), &added[0]) != 0 {
+		// tasks failed to add are tried again in next call
+		for _, pid := range added {
+			delete(current, pid)
+		}
+	}
+	if len(removed) > 0 {
+		// exited tasks may be gone from the group already
+		C.pgos_mon_remove_pids(this.PgosHandler, C.unsigned(len(removed)), &removed[0])
+	}
+	this.PgosPids = current
+	return 0
+}
+
+func (this *Cgroup) Start() C.int {
+	var code C.int = 0
+	for i := 0; i < len(this.Leaders); i++ {
+		code |= StartLeader(this.Leaders[i])
+	}
+	for i := 0; i < len(this.ExtraLeaders); i++ {
+		code |= StartLeader(this.ExtraLeaders[i])
+	}
+	// times are not cleared by reset, reads after start are taken relative
+	// to the ones read here
+	this.LeaderReads = make([]PerfStruct, len(this.Leaders))
+	for i := 0; i < len(this.Leaders) && code == 0; i++ {
+		this.LeaderReads[i], code = ReadLeader(this.Leaders[i])
+	}
+	this.ExtraReads = make([]PerfStruct, len(this.ExtraLeaders))
+	for i := 0; i < len(this.ExtraLeaders) && code == 0; i++ {
+		this.ExtraReads[i], code = ReadLeader(this.ExtraLeaders[i])
+	}
+	this.Started = code == 0
+	this.Sampled = false
+	this.LastRead = time.Now()
+	return code
+}
+
+func (this *Cgroup) Stop() C.int {
+	var code C.int = 0
+	for i := 0; i < len(this.Leaders); i++ {
+		code |= StopLeader(this.Leaders[i])
+	}
+	for i := 0; i < len(this.ExtraLeaders); i++ {
+		code |= StopLeader(this.ExtraLeaders[i])
+	}
+	this.Started = false
+	return code
+}
+
+// Read sums scaled counters of all cores followed by sums of every socket,
+// then time enabled and time running of every group summed over all cores,
+// all since previous Read or Start, counters are not stopped
+func (this *Cgroup) Read() ([]uint64, C.int) {
+	events := len(counters) + len(extraCounters)
+	groups := extraGroups()
+	res := make([]uint64, (socketCount+1)*events+2*(groups+1))
+	times := res[(socketCount+1)*events:]
+	for i := 0; i < len(this.Leaders); i++ {
+		sres := res[(coreSocket[this.Cpus[i]]+1)*events:]
+		code := readGroup(this.Leaders[i], &this.LeaderReads[i], res, sres, times)
+		if code != 0 {
+			return nil, code
+		}
+		for g := 0; g < groups; g++ {
+			offset := len(counters) + g*maxGroupEvents
+			code = readGroup(this.ExtraLeaders[i*groups+g], &this.ExtraReads[i*groups+g], res[offset:], sres[offset:], times[2*(g+1):])
+			if code != 0 {
+				return nil, code
+			}
+		}
+	}
+	return res, 0
+}
+
+// readGroup adds scaled counts of group since last read into total and
+// socket sums, and its time enabled and time running into times, last read
+// is replaced by current one
+func readGroup(leader uintptr, last *PerfStruct, total, socket, times []uint64) C.int {
+	result, code := ReadLeader(leader)
+	if code != 0 {
+		return code
+	}
+	delta := result.Delta(*last)
+	*last = result
+	times[0] += delta.TimeEnabled
+	times[1] += delta.TimeRunning
+	for l := range delta.Values {
+		total[l] += delta.Values[l]
+		socket[l] += delta.Values[l]
+	}
+	return 0
 }
 
 func (this *Cgroup) Close() {
@@ -252,6 +793,13 @@ func (this *Cgroup) Close() {
 	for i := 0; i < len(this.Leaders); i++ {
 		syscall.Close(int(this.Leaders[i]))
 	}
+	for i := 0; i < len(this.ExtraLeaders); i++ {
+		syscall.Close(int(this.ExtraLeaders[i]))
+	}
+	if this.PgosStarted {
+		C.pgos_mon_stop_group(this.PgosHandler)
+		this.PgosStarted = false
+	}
 	this.File.Close()
 	return
 }
@@ -27,7 +27,6 @@ package main
 //
 import "C"
 import (
-	"bytes"
 	"encoding/binary"
 	"syscall"
 	"unsafe"
@@ -51,21 +50,48 @@ func ioctl(fd, req, arg uintptr) C.int {
 	return 0
 }
 
+// PerfStruct is one group read, values are raw counts in group order
 type PerfStruct struct {
-	Size        uint64
 	TimeEnabled uint64
 	TimeRunning uint64
-	Data        [5]struct {
-		Value uint64
-		ID    uint64
+	Values      []uint64
+}
+
+// scale returns count scaled by time enabled over time running, which
+// corrects the count when the group is multiplexed, 0 if the group never ran
+func scale(count, enabled, running uint64) uint64 {
+	if running == 0 {
+		return 0
+	}
+	if running == enabled {
+		return count
+	}
+	return uint64(float64(count) / float64(running) * float64(enabled))
+}
+
+// Delta returns counts and times of the group since last read of it, counts
+// are scaled by time enabled and time running of that interval only, since
+// reset clears counts but not times
+func (this PerfStruct) Delta(last PerfStruct) PerfStruct {
+	res := PerfStruct{
+		TimeEnabled: this.TimeEnabled - last.TimeEnabled,
+		TimeRunning: this.TimeRunning - last.TimeRunning,
+		Values:      make([]uint64, len(this.Values)),
 	}
+	for i, value := range this.Values {
+		if i < len(last.Values) && value >= last.Values[i] {
+			value -= last.Values[i]
+		}
+		res.Values[i] = scale(value, res.TimeEnabled, res.TimeRunning)
+	}
+	return res
 }
 
 func OpenLeader(cgroupFd uintptr, cpu uintptr, perfType C.uint32_t, perfConfig C.uint64_t) (uintptr, C.int) {
 	leaderAttr := C.struct_perf_event_attr{
 		_type:       C.__u32(perfType),
 		size:        C.__u32(C.def_PERF_ATTR_SIZE_VER5),
-		config:      C.__u64(C.get_config_of_event(perfType, perfConfig)),
+		config:      C.__u64(perfConfig),
 		sample_type: C.PERF_SAMPLE_IDENTIFIER,
 		read_format: C.PERF_FORMAT_GROUP |
 			C.PERF_FORMAT_TOTAL_TIME_ENABLED |
@@ -80,7 +106,7 @@ func OpenFollower(leader uintptr, cpu uintptr, perfType C.uint32_t, perfConfig C
 	followerAttr := C.struct_perf_event_attr{
 		_type:       C.__u32(perfType),
 		size:        C.__u32(C.def_PERF_ATTR_SIZE_VER5),
-		config:      C.__u64(C.get_config_of_event(perfType, perfConfig)),
+		config:      C.__u64(perfConfig),
 		sample_type: C.PERF_SAMPLE_IDENTIFIER,
 		read_format: C.PERF_FORMAT_GROUP |
 			C.PERF_FORMAT_TOTAL_TIME_ENABLED |
@@ -102,20 +128,25 @@ func StopLeader(leader uintptr) C.int {
 	return ioctl(leader, C.PERF_EVENT_IOC_DISABLE, 0)
 }
 
+// ReadLeader reads group of leader in PERF_FORMAT_GROUP layout: number of
+// events, time enabled, time running, then value and id of every event
 func ReadLeader(leader uintptr) (PerfStruct, C.int) {
-	b := make([]byte, 1000)
-	_, err := syscall.Read(int(leader), b)
-	if err != nil {
+	b := make([]byte, 1024)
+	n, err := syscall.Read(int(leader), b)
+	if err != nil || n < 24 {
 		return PerfStruct{}, ErrorCannotPerfomSyscall
 	}
-	var result PerfStruct
-	binary.Read(bytes.NewBuffer(b), binary.LittleEndian, &result)
-	for i := 0; i < len(result.Data); i++ {
-		if result.TimeRunning == 0 {
-			result.Data[i].Value = 0
-		} else {
-			result.Data[i].Value = uint64(float64(result.Data[i].Value) / float64(result.TimeRunning) * float64(result.TimeEnabled))
-		}
+	nr := int(binary.LittleEndian.Uint64(b[0:]))
+	if n < 24+16*nr {
+		return PerfStruct{}, ErrorCannotPerfomSyscall
+	}
+	result := PerfStruct{
+		TimeEnabled: binary.LittleEndian.Uint64(b[8:]),
+		TimeRunning: binary.LittleEndian.Uint64(b[16:]),
+		Values:      make([]uint64, nr),
+	}
+	for i := 0; i < nr; i++ {
+		result.Values[i] = binary.LittleEndian.Uint64(b[24+16*i:])
 	}
 	return result, 0
 }
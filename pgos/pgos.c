@@ -21,31 +21,70 @@
 
 #define MAX_PID_GROUP 100
 
+// monitoring groups live until stopped, a slot is reused after its group
+// is stopped
 struct pqos_mon_data data[MAX_PID_GROUP];
-int idx = 0;
+int used[MAX_PID_GROUP];
+
+static int valid_index(int index) {
+    return index >= 0 && index < MAX_PID_GROUP && used[index];
+}
+
 int pgos_mon_start_pids(unsigned pid_num, pid_t *pids) {
-    if (idx >= MAX_PID_GROUP) {
+    int i;
+    for (i = 0;i < MAX_PID_GROUP;i ++) {
+        if (!used[i]) {
+            break;
+        }
+    }
+    if (i >= MAX_PID_GROUP) {
+        return -1;
+    }
+    memset(&data[i], 0, sizeof(struct pqos_mon_data));
+    int ret = pqos_mon_start_pids(pid_num, pids, PQOS_MON_EVENT_L3_OCCUP | PQOS_MON_EVENT_LMEM_BW |PQOS_MON_EVENT_RMEM_BW  , NULL, &data[i]);
+    if (ret != PQOS_RETVAL_OK) {
+        return -1;
+    }
+    used[i] = 1;
+    return i;
+}
+
+int pgos_mon_add_pids(int index, unsigned pid_num, pid_t *pids) {
+    if (!valid_index(index)) {
         return -1;
     }
-	int ret = pqos_mon_start_pids(pid_num, pids, PQOS_MON_EVENT_L3_OCCUP | PQOS_MON_EVENT_LMEM_BW |PQOS_MON_EVENT_RMEM_BW  , NULL, &data[idx]);
-    return idx ++;
+    return pqos_mon_add_pids(pid_num, pids, &data[index]);
+}
+
+int pgos_mon_remove_pids(int index, unsigned pid_num, pid_t *pids) {
+    if (!valid_index(index)) {
+        return -1;
+    }
+    return pqos_mon_remove_pids(pid_num, pids, &data[index]);
 }
 
 struct pqos_event_values pgos_mon_poll(int index) {
-    if (index < 0 || index > idx) {
+    if (!valid_index(index)) {
         struct pqos_event_values zero_ret;
         memset(&zero_ret, 0, sizeof(struct pqos_event_values));
         return zero_ret;
     }
     struct pqos_mon_data *data_addr = &data[index];
-    int ret = pqos_mon_poll(&data_addr, 1);
+    pqos_mon_poll(&data_addr, 1);
     return data[index].values;
 }
 
+void pgos_mon_stop_group(int index) {
+    if (!valid_index(index)) {
+        return;
+    }
+    pqos_mon_stop(&data[index]);
+    used[index] = 0;
+}
+
 void pgos_mon_stop() {
     int i;
-    for (i = 0;i < idx;i ++) {
-        pqos_mon_stop(&data[i]);
+    for (i = 0;i < MAX_PID_GROUP;i ++) {
+        pgos_mon_stop_group(i);
     }
-    idx = 0;
 }
\ No newline at end of file
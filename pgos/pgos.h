@@ -23,7 +23,10 @@
 #include <sys/types.h>
 
 int pgos_mon_start_pids(unsigned pid_num, pid_t *pids);
+int pgos_mon_add_pids(int index, unsigned pid_num, pid_t *pids);
+int pgos_mon_remove_pids(int index, unsigned pid_num, pid_t *pids);
 struct pqos_event_values pgos_mon_poll(int index);
+void pgos_mon_stop_group(int index);
 void pgos_mon_stop();
 
 #endif
\ No newline at end of file
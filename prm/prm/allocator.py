@@ -48,7 +48,8 @@ class ResourceAllocator(Allocator):
         model_pull_cycle: float = 180,
         metric_file: str = Analyzer.METRIC_FILE,
         enable_control: bool = True,
-        exclusive_cat: bool = False
+        exclusive_cat: bool = False,
+        lc_sockets: List[int] = None
     ):
         log.debug('action_delay: %i, agg_period: %i, exclusive: %s, model_pull_cycle: %i',
                   action_delay, agg_period, exclusive_cat, model_pull_cycle)
@@ -77,9 +78,11 @@ class ResourceAllocator(Allocator):
             self.cycle = 0
         if enable_control:
             self.cpuc = CpuCycle(self.analyzer.get_lcutilmax(), 0.5, False)
-            self.l3c = LlcOccup(self.exclusive_cat)
+            # BE is throttled only on sockets where LC is pinned if given
+            sockets = set(lc_sockets) if lc_sockets else None
+            self.l3c = LlcOccup(self.exclusive_cat, sockets)
             self.mbc_enabled = True
-            self.mbc = MemoryBw()
+            self.mbc = MemoryBw(sockets)
             cpuc_controller = NaiveController(self.cpuc, 15)
             llc_controller = NaiveController(self.l3c, 4)
             mb_controller = NaiveController(self.mbc, 4)
@@ -185,8 +185,14 @@ class Analyzer:
                     log.exception('error in build threshold util=%r (%r)',
                                   job, util)
 
+    @staticmethod
+    def _read_data(data_file):
+        if isinstance(data_file, pd.DataFrame):
+            return data_file
+        return pd.read_csv(data_file)
+
     def _process_lc_max(self, util_file):
-        udf = pd.read_csv(util_file)
+        udf = self._read_data(util_file)
         lcs = udf[udf['name'] == 'lcs']
         lcu = lcs[Metric.UTIL]
         maxulc = int(lcu.max())
@@ -213,7 +219,7 @@ class Analyzer:
             return
 
         self._process_lc_max(util_file)
-        mdf = pd.read_csv(metric_file)
+        mdf = self._read_data(metric_file)
         cnames = mdf['name'].unique()
         for cname in cnames:
             self.threshold[cname] = {ThreshType.TDP.value: {}, ThreshType.METRICS.value: []}
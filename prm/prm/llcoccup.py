@@ -29,10 +29,16 @@ log = logging.getLogger(__name__)
 class LlcOccup(Resource):
     """ This class is the resource class of LLC occupancy """
 
-    def __init__(self, exclusive):
+    def __init__(self, exclusive, sockets=None):
+        """
+        exclusive - use exclusive bitmasks for BE and LC
+        sockets - sockets where BE is throttled, None means all sockets,
+            full bitmask level is used on other sockets
+        """
         self.be_bmp = []
         self.lc_bmp = []
         self.exclusive = exclusive
+        self.sockets = sockets
         super(LlcOccup, self).__init__()
 
     def update_allocs(self, cur_allocs, new_allocs, cbm_mask, nsocks):
@@ -57,6 +63,11 @@ class LlcOccup(Resource):
         setbits = [bit for bit in cbm_bin[2:] if bit == '1']
         return len(setbits)
 
+    def _socket_level(self, idx):
+        if self.sockets is None or idx in self.sockets:
+            return self.quota_level
+        return Resource.BUGET_LEV_FULL
+
     def _budgeting(self, cid, is_be):
         if is_be:
             bmp = self.be_bmp
@@ -64,7 +75,8 @@ class LlcOccup(Resource):
         else:
             bmp = self.lc_bmp
             name = 'LC_Group'
-        l3s = [str(idx) + '=' + bmp[self.quota_level] for idx in range(self.nsocks)]
+        l3s = [str(idx) + '=' + bmp[self._socket_level(idx)]
+               for idx in range(self.nsocks)]
         l3_allocs = 'L3:' + ';'.join(l3s)
         self.set_alloc(cid, AllocationType.RDT, l3_allocs, RDTResource.L3, name)
 
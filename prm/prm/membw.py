@@ -29,10 +29,15 @@ log = logging.getLogger(__name__)
 class MemoryBw(Resource):
     """ This class is the resource class of memory bandwidth """
 
-    def __init__(self):
+    def __init__(self, sockets=None):
+        """
+        sockets - sockets where BE is throttled, None means all sockets,
+            full bandwidth is used on other sockets
+        """
         super(MemoryBw, self).__init__()
         self.cur_allocs = None
         self.new_allocs = None
+        self.sockets = sockets
 
     def update_allocs(self, cur_allocs, new_allocs, min_bandwidth, bandwidth_gran, nsocks):
         self.cur_allocs = cur_allocs
@@ -55,6 +60,8 @@ class MemoryBw(Resource):
         if bes:
             name = 'BE_Group'
             for cid in bes:
-                mbs = [str(idx) + '=' + str(self.mb_value) for idx in range(self.nsocks)]
+                mbs = [str(idx) + '=' + str(self.mb_value if self.sockets is None or
+                                            idx in self.sockets else 100)
+                       for idx in range(self.nsocks)]
                 mb_allocs = 'MB:' + ';'.join(mbs)
                 self.set_alloc(cid, AllocationType.RDT, mb_allocs, RDTResource.MB, name)